@@ -1,20 +1,23 @@
 import streamlit as st
-import pandas as pd
 import pydeck as pdk
 
+import datastore
+import stations
+
 st.title("Meetlocaties")
 
-# Coördinaten
-coordinates = [
-    (52.3597533, 4.9070122),
-    (52.3406215, 4.9161200),  # Spaklerweg
-    (52.3659139, 4.9005303),
-    (52.3677279, 4.8938338),
-    (52.3674163, 4.8847137),
-]
 
-# DataFrame
-df = pd.DataFrame(coordinates, columns=["lat", "lon"])
+# Zonder register één station per locatie in de data, opnieuw bepaald als de data verandert
+@st.cache_data
+def stations_uit_data(data_versie):
+    return stations.build_registry(datastore.backend().load())
+
+
+# Coördinaten uit het stationsregister (alleen opnieuw gelezen als het bestand verandert)
+df = stations.registry().stations
+if df.empty:
+    df = stations_uit_data(datastore.backend().data_version())
+df = df.reset_index()
 
 # Google-style pin icoon
 df["icon_data"] = [{
@@ -44,4 +47,5 @@ st.pydeck_chart(pdk.Deck(
             pickable=True,
         ),
     ],
+    tooltip={"text": "{naam}"},
 ))
@@ -0,0 +1,226 @@
+import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import pandas as pd
+
+import datastore
+import dateindex
+import export
+import mapview
+import preprocessing
+import shareddata
+import synthdata
+
+# ---------- Benchmark van het datapad ----------
+# Times the stages a dashboard session goes through on generated datasets of
+# increasing size (see synthdata.py), per storage backend, and appends the
+# results to a JSON lines file. Every record carries the git version it was
+# measured on, so two versions can be compared and regressions show up.
+#
+#   python benchmark.py run [--rijen 1000 10000 100000 1000000] [--opslag parquet sqlite]
+#   python benchmark.py compare <basisversie> [<nieuwe versie>]
+#
+# Each stage is timed HERHALINGEN times (the fastest counts) and then run once
+# more under tracemalloc for its peak memory. tracemalloc sees the allocations
+# of Python, pandas and numpy, not those inside pyarrow or SQLite.
+
+RESULTATEN_FILE = os.environ.get("WATERKWALITEIT_BENCHMARK_FILE", "benchmark_resultaten.jsonl")
+HERHALINGEN = 3
+RIJEN = [1_000, 10_000, 100_000]
+OPSLAG = ['parquet', 'sqlite']
+
+# A stage counts as a regression when it is this much slower or larger
+DREMPEL = 0.2
+
+WAARDES = ['PH', 'Temperatuur', 'EC']
+
+
+class Context:
+    # What the stages of one dataset share: the dataset as a dashboard loads it,
+    # and the busiest day as the selected date
+
+    def __init__(self, path, excel_file):
+        self.path = path
+        self.excel_file = excel_file
+        self.dataset = shareddata.SharedDataset(path)
+        self.data = self.dataset.snapshot().data
+        self.dag = self.data['Datum'].dt.normalize().mode().iloc[0]
+        self.van = self.data['Datum'].min()
+        self.tot = self.data['Datum'].max()
+        self.dag_rows = self.dataset.day_rows(self.data, self.dag)
+
+
+# ---------- Stappen ----------
+# Named after what the dashboards do; each takes the Context
+def load_excel(ctx):
+    # The original load_data: the whole workbook on every start
+    return preprocessing.prepare_frame(datastore.read_excel(ctx.excel_file))
+
+
+def load(ctx):
+    return shareddata.SharedDataset(ctx.path)
+
+
+def date_index(ctx):
+    # Built on the first rerun after every write
+    return dateindex.build_date_index(ctx.data)
+
+
+def date_filter(ctx):
+    return ctx.dataset.day_rows(ctx.data, ctx.dag)
+
+
+def marker_map(ctx):
+    # Including the HTML, which st_folium sends to the browser
+    return mapview.build_map(ctx.dag_rows, WAARDES).get_root().render()
+
+
+def save(ctx):
+    return ctx.dataset.insert([{
+        'Locatie': 'Benchmark', 'Coordinaten': '52.3597533, 4.9070122', 'PH': 7.4,
+        'Temperatuur': 15.0, 'Datum': ctx.dag, 'Meetdag': ctx.dag,
+    }])
+
+
+def export_excel(ctx):
+    return export.export_file(ctx.van, ctx.tot, 'Excel', ctx.path)
+
+
+STAPPEN = {
+    'load_excel': load_excel,
+    'load': load,
+    'date_index': date_index,
+    'date_filter': date_filter,
+    'map': marker_map,
+    'save': save,
+    'export_excel': export_excel,
+}
+
+
+def measure(stap, ctx, herhalingen=HERHALINGEN):
+    tijden = []
+    for _ in range(herhalingen):
+        start = time.perf_counter()
+        stap(ctx)
+        tijden.append(time.perf_counter() - start)
+    tracemalloc.start()
+    try:
+        stap(ctx)
+        _, piek = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return min(tijden), piek / 1024 ** 2
+
+
+def version():
+    # The commit the code was measured on, '-dirty' with local changes
+    try:
+        return subprocess.run(
+            ["git", "describe", "--always", "--dirty"], capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "onbekend"
+
+
+def dataset_files(rijen, opslag, map_):
+    # Generated once per size and kept in map_, so later runs reuse them
+    nodig = [f for f in ['xlsx', opslag] if not os.path.exists(os.path.join(map_, synthdata.file_name(rijen, f)))]
+    if nodig:
+        synthdata.generate_files(rijen, map_, nodig)
+    return os.path.join(map_, synthdata.file_name(rijen, opslag)), os.path.join(map_, synthdata.file_name(rijen, 'xlsx'))
+
+
+def run(rijen=RIJEN, opslag=OPSLAG, stappen=STAPPEN, herhalingen=HERHALINGEN, map_=None, label=None):
+    basis = {
+        'versie': version(),
+        'label': label,
+        'tijdstip': pd.Timestamp.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'pandas': pd.__version__,
+    }
+    map_ = map_ or tempfile.mkdtemp(prefix="waterkwaliteit_bench_")
+    os.makedirs(map_, exist_ok=True)
+    for aantal in rijen:
+        gemeten = set()
+        for backend in opslag:
+            bron, excel_file = dataset_files(aantal, backend, map_)
+            # The stages write (save), so they run on a copy of the dataset
+            with tempfile.TemporaryDirectory() as werkmap:
+                path = shutil.copy(bron, werkmap)
+                ctx = Context(path, excel_file)
+                for naam in stappen:
+                    # The workbook does not depend on the backend, it is read once per size
+                    bron_opslag = 'xlsx' if naam == 'load_excel' else backend
+                    if (naam, bron_opslag) in gemeten:
+                        continue
+                    gemeten.add((naam, bron_opslag))
+                    seconden, piek_mb = measure(STAPPEN[naam], ctx, herhalingen)
+                    yield dict(basis, rijen=aantal, opslag=bron_opslag, stap=naam,
+                               seconden=round(seconden, 6), piek_mb=round(piek_mb, 3), herhalingen=herhalingen)
+
+
+def read_results(path=RESULTATEN_FILE):
+    with open(path, encoding="utf-8") as f:
+        return pd.DataFrame([json.loads(regel) for regel in f if regel.strip()])
+
+
+def compare(resultaten, basis, nieuw=None, drempel=DREMPEL):
+    # One row per (rijen, opslag, stap) measured in both versions; of repeated
+    # runs of one version the fastest and smallest count
+    if nieuw is None:
+        nieuw = resultaten['versie'].iloc[-1]
+    sleutel = ['rijen', 'opslag', 'stap']
+    per_versie = resultaten.groupby(['versie'] + sleutel)[['seconden', 'piek_mb']].min()
+    vergelijking = per_versie.loc[basis].join(per_versie.loc[nieuw], how='inner', lsuffix=' basis', rsuffix=' nieuw')
+    vergelijking['tijd x'] = vergelijking['seconden nieuw'] / vergelijking['seconden basis']
+    vergelijking['geheugen x'] = vergelijking['piek_mb nieuw'] / vergelijking['piek_mb basis']
+    vergelijking['regressie'] = (vergelijking['tijd x'] > 1 + drempel) | (vergelijking['geheugen x'] > 1 + drempel)
+    return vergelijking
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark van het datapad van de dashboards")
+    parser.add_argument("--resultaten", default=RESULTATEN_FILE, help="JSON lines bestand met de resultaten")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = commands.add_parser("run", help="Stappen meten en de resultaten toevoegen")
+    run_parser.add_argument("--rijen", type=int, nargs="+", default=RIJEN)
+    run_parser.add_argument("--opslag", nargs="+", choices=OPSLAG, default=OPSLAG)
+    run_parser.add_argument("--stappen", nargs="+", choices=list(STAPPEN), default=list(STAPPEN))
+    run_parser.add_argument("--herhalingen", type=int, default=HERHALINGEN)
+    run_parser.add_argument("--map", help="Map voor de gegenereerde datasets, hergebruikt bij een volgende run")
+    run_parser.add_argument("--label", help="Vrije omschrijving, bijv. de machine")
+
+    compare_parser = commands.add_parser("compare", help="Twee versies vergelijken")
+    compare_parser.add_argument("basis")
+    compare_parser.add_argument("nieuw", nargs="?", help="Standaard de laatst gemeten versie")
+    compare_parser.add_argument("--drempel", type=float, default=DREMPEL)
+
+    args = parser.parse_args(argv)
+    if args.command == "run":
+        with open(args.resultaten, "a", encoding="utf-8") as f:
+            for resultaat in run(args.rijen, args.opslag, args.stappen, args.herhalingen, args.map, args.label):
+                f.write(json.dumps(resultaat) + "\n")
+                f.flush()
+                print(f"{resultaat['rijen']:>9} {resultaat['opslag']:<8} {resultaat['stap']:<13}"
+                      f" {resultaat['seconden']:>10.4f} s {resultaat['piek_mb']:>10.1f} MB")
+        print(f"Resultaten toegevoegd aan {args.resultaten}")
+    elif args.command == "compare":
+        vergelijking = compare(read_results(args.resultaten), args.basis, args.nieuw, args.drempel)
+        print(vergelijking.to_string(float_format="{:.3f}".format))
+        # Non-zero exit status, so a regression can fail a CI job
+        if vergelijking['regressie'].any():
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,566 @@
+import argparse
+import contextlib
+import json
+import math
+import os
+import sys
+import threading
+import uuid
+from typing import NamedTuple
+
+import pandas as pd
+import pyarrow.parquet as pq
+
+# ---------- Opslag van de meetdata ----------
+# The canonical dataset is kept in a Parquet file with typed columns, so the
+# dashboards no longer have to parse a whole workbook through openpyxl on every
+# (re)load. Excel is only used as an import/export format.
+
+# Can be overridden per deployment, e.g. WATERKWALITEIT_DATA_FILE=/data/metingen.parquet
+DATA_FILE = os.environ.get("WATERKWALITEIT_DATA_FILE", "Waterkwaliteit.parquet")
+EXCEL_FILE = os.environ.get("WATERKWALITEIT_EXCEL_FILE", "Waterkwaliteit.xlsx")
+
+# Inserts and deletes are appended to "<DATA_FILE>.journal" instead of rewriting
+# the store; the write that takes the journal past this size starts merging it
+# into the store in a background thread (see compact).
+COMPACT_BYTES = int(os.environ.get("WATERKWALITEIT_COMPACT_BYTES", 1_000_000))
+
+COLUMNS = [
+    'Locatie', 'Meetdag', 'Datum', 'Coordinaten', 'PH', 'Temperatuur',
+    'ORP', 'EC', 'CF', 'TDS', 'Humidity', 'Buitentemperatuur', 'station_id'
+]
+DATE_COLUMNS = ['Meetdag', 'Datum']
+
+# Integer key of the station a measurement was snapped to (see stations.py);
+# empty for measurements that are not near a known station
+STATION_COLUMN = 'station_id'
+
+# Every measurement gets a persistent id when it is inserted. In memory it is
+# the index of the frame, in the store and in the journal a regular column.
+ID_COLUMN = 'meting_id'
+
+# Data files with one of these extensions are kept in SQLite (see sqlstore.py)
+SQLITE_EXTENSIONS = ('.sqlite', '.sqlite3', '.db')
+
+
+def backend(path=DATA_FILE):
+    # The module that stores 'path': sqlstore for SQLite files, otherwise this
+    # one. Both offer the same load/append_rows/delete_rows/update_rows/
+    # iter_range/journal functions.
+    if str(path).lower().endswith(SQLITE_EXTENSIONS):
+        import sqlstore
+        return sqlstore
+    return sys.modules[__name__]
+
+
+def new_id():
+    return uuid.uuid4().hex
+
+
+def empty_frame():
+    # Empty DataFrame with ALL expected columns and typed date columns
+    df = pd.DataFrame(columns=COLUMNS, index=pd.Index([], dtype=object, name=ID_COLUMN))
+    for col in DATE_COLUMNS:
+        df[col] = pd.to_datetime(df[col])
+    return df
+
+
+def with_ids(df):
+    # Use the id column as index; rows without an id (old stores and workbooks) get one
+    if ID_COLUMN in df.columns:
+        ids = df[ID_COLUMN].astype(object)
+        missing = ids.isna()
+        ids[missing] = [new_id() for _ in range(missing.sum())]
+        df = df.drop(columns=ID_COLUMN)
+    else:
+        ids = [new_id() for _ in range(len(df))]
+    df.index = pd.Index(ids, dtype=object, name=ID_COLUMN)
+    return df
+
+
+def normalize_frame(df):
+    # Spaties verwijderen uit kolomnamen
+    df.columns = df.columns.str.strip()
+
+    # Ensure 'Meetdag' exists and is converted to datetime
+    if 'Meetdag' in df.columns:
+        df['Meetdag'] = pd.to_datetime(df['Meetdag'], dayfirst=True, errors='coerce')
+    else:
+        df['Meetdag'] = pd.NaT
+
+    # Ensure 'Datum' column exists. If it exists, convert it. If not, create from 'Meetdag'.
+    if 'Datum' in df.columns:
+        df['Datum'] = pd.to_datetime(df['Datum'], dayfirst=True, errors='coerce')
+    else:
+        df['Datum'] = df['Meetdag']
+
+    # Columns that are missing from the source are added empty
+    for col in COLUMNS:
+        if col not in df.columns:
+            df[col] = None
+    # Nullable integer, so the key does not end up as text or float in the store
+    df[STATION_COLUMN] = pd.to_numeric(df[STATION_COLUMN], errors='coerce').astype('Int64')
+    return df
+
+
+def _arrow_safe(df):
+    # Parquet needs one type per column; free-text columns from Excel can mix
+    # numbers and strings (e.g. "10km/u" next to 10), so those become strings.
+    df = df.copy()
+    for col in df.columns:
+        if df[col].dtype == object:
+            values = df[col]
+            df[col] = values.where(values.isna(), values.astype(str))
+    return df
+
+
+# ---------- Excel import/export ----------
+def read_excel(path):
+    return with_ids(normalize_frame(pd.read_excel(path)))
+
+
+def write_excel(df, path):
+    df.reset_index().to_excel(path, index=False)
+
+
+# ---------- Parquet store ----------
+def read_store(path=DATA_FILE):
+    try:
+        df = pd.read_parquet(path)
+    except FileNotFoundError:
+        return empty_frame()
+    return with_ids(normalize_frame(df))
+
+
+def store_has_ids(path=DATA_FILE):
+    return ID_COLUMN in pq.read_schema(path).names
+
+
+def write_store(df, path=DATA_FILE):
+    # Write to a temporary file first so readers never see a half-written store
+    os.replace(_write_tmp(df, path), path)
+
+
+def _write_tmp(df, path, tmp_path=None):
+    tmp_path = tmp_path or f"{path}.tmp"
+    _arrow_safe(df.reset_index()).to_parquet(tmp_path, index=False)
+    return tmp_path
+
+
+def migrate_excel(excel_files, path=DATA_FILE, dedupe=False):
+    frames = [read_excel(f) for f in excel_files]
+    df = pd.concat(frames) if frames else empty_frame()
+    if dedupe:
+        df = df.drop_duplicates()
+    return replace_store(df, path)
+
+
+def replace_store(df, path=DATA_FILE):
+    # The whole dataset, e.g. an import or a generated benchmark set (see synthdata.py)
+    with _locked(path):
+        write_store(df, path)
+        _remove_journal(path)
+    return df
+
+
+# ---------- Append-only journal ----------
+# Each line is one JSON operation, keyed on the measurement ids:
+#   {"op": "insert", "rows": [{"meting_id": "...", ...}, ...]}
+#   {"op": "delete", "ids": ["...", ...]}
+#   {"op": "update", "changes": {"<meting_id>": {"PH": 7.1}, ...}}
+# Replaying the journal on top of the store gives the current dataset, so a new
+# measurement costs one appended line regardless of the size of the store.
+# Operations on ids do not depend on row order, so two sessions writing at the
+# same time cannot delete or overwrite each other's rows by position.
+def journal_path(path=DATA_FILE):
+    return f"{path}.journal"
+
+
+@contextlib.contextmanager
+def _locked(path, shared=False):
+    # Serialize writers (appends and compaction) across sessions and processes;
+    # readers take it shared, so they never see a store and journal from
+    # different sides of a compaction
+    with open(f"{path}.lock", "a") as lock_file:
+        try:
+            import fcntl
+            fcntl.flock(lock_file, fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+        except ImportError:  # Windows, exclusive only
+            import msvcrt
+            msvcrt.locking(lock_file.fileno(), msvcrt.LK_LOCK, 1)
+        yield
+
+
+def _json_value(value):
+    if value is None or value is pd.NaT or value is pd.NA:
+        return None
+    if isinstance(value, pd.Timestamp):
+        return value.isoformat()
+    if hasattr(value, 'item'):  # numpy scalars
+        value = value.item()
+    if isinstance(value, float) and math.isnan(value):
+        return None
+    return value
+
+
+def _append_journal(entry, path):
+    line = (json.dumps(entry, default=str, ensure_ascii=False) + "\n").encode("utf-8")
+    with _locked(path):
+        with open(journal_path(path), "ab+") as journal:
+            # Never glue a new entry onto a partial line left behind by a crash
+            if journal.tell() > 0:
+                journal.seek(-1, os.SEEK_END)
+                if journal.read(1) != b"\n":
+                    line = b"\n" + line
+            journal.write(line)
+            journal.flush()
+            os.fsync(journal.fileno())
+            groot = journal.tell() > COMPACT_BYTES
+    # Not on this write: the merge costs a read and a write of the whole store
+    if groot:
+        compact_in_background(path)
+
+
+def append_rows(rows, path=DATA_FILE):
+    if isinstance(rows, pd.DataFrame):
+        rows = rows.reset_index().to_dict('records') if rows.index.name == ID_COLUMN else rows.to_dict('records')
+    rows = [{col: _json_value(val) for col, val in row.items()} for row in rows]
+    for row in rows:
+        if not row.get(ID_COLUMN):
+            row[ID_COLUMN] = new_id()
+    if rows:
+        _append_journal({"op": "insert", "rows": rows}, path)
+    return [row[ID_COLUMN] for row in rows]
+
+
+def delete_rows(ids, path=DATA_FILE):
+    ids = [str(meting_id) for meting_id in ids]
+    if ids:
+        _append_journal({"op": "delete", "ids": ids}, path)
+
+
+def update_rows(changes, path=DATA_FILE):
+    # changes: {meting_id: {kolom: nieuwe waarde}}
+    changes = {
+        str(meting_id): {col: _json_value(val) for col, val in values.items()}
+        for meting_id, values in changes.items() if values
+    }
+    if changes:
+        _append_journal({"op": "update", "changes": changes}, path)
+
+
+def read_journal(path=DATA_FILE):
+    return read_journal_from(0, path)[0]
+
+
+def read_journal_from(offset, path=DATA_FILE):
+    # Entries appended after byte 'offset', plus the offset to continue from.
+    # Only complete lines are consumed; a line that is still being written is
+    # read on the next call.
+    try:
+        with open(journal_path(path), "rb") as journal:
+            journal.seek(offset)
+            data = journal.read()
+    except FileNotFoundError:
+        return [], 0
+    einde = data.rfind(b"\n") + 1
+    entries = []
+    for line in data[:einde].decode("utf-8").splitlines():
+        try:
+            entries.append(json.loads(line))
+        except json.JSONDecodeError:
+            # A crash mid-write can leave a partial line; it was never acknowledged
+            continue
+    return entries, offset + einde
+
+
+def rows_frame(rows, df):
+    new_df = pd.DataFrame(rows)
+    for col in DATE_COLUMNS:
+        if col in new_df.columns:
+            new_df[col] = pd.to_datetime(new_df[col], format='ISO8601', errors='coerce')
+    # Keep numeric columns numeric (JSON null would otherwise make them object)
+    for col in new_df.columns.intersection(df.columns):
+        if pd.api.types.is_numeric_dtype(df[col]) and col not in DATE_COLUMNS:
+            values = new_df[col]
+            if not pd.api.types.is_numeric_dtype(values):
+                values = values.astype(str).str.replace(',', '.')  # comma decimals such as "7,2"
+            new_df[col] = pd.to_numeric(values, errors='coerce')
+    return with_ids(new_df)
+
+
+def apply_changes(df, changes):
+    # Returns a new frame; only the changed columns are copied, the rest is shared
+    df = df.copy(deep=False)
+    for col in {col for values in changes.values() for col in values}:
+        if col in df.columns:
+            df[col] = df[col].copy()
+    for meting_id, values in changes.items():
+        if meting_id not in df.index:
+            continue  # deleted in the meantime
+        for col, value in values.items():
+            if col in DATE_COLUMNS:
+                value = pd.to_datetime(value, errors='coerce')
+            elif isinstance(df[col].dtype, pd.CategoricalDtype) and pd.notna(value) and value not in df[col].cat.categories:
+                df[col] = df[col].cat.add_categories([value])  # e.g. a location that was renamed
+            df.loc[meting_id, col] = value
+    return df
+
+
+def _insert(df, rows):
+    # An insert whose id is already there replaces that row. Replaying the
+    # journal is then idempotent: after a crash between replacing the store and
+    # cutting the journal (see compact), the store already holds its inserts.
+    nieuw = rows_frame(rows, df)
+    nieuw = nieuw[~nieuw.index.duplicated(keep='last')]
+    return pd.concat([df.drop(df.index.intersection(nieuw.index)), nieuw])
+
+
+def apply_journal(df, entries):
+    pending = []
+    for entry in entries:
+        if entry["op"] == "insert":
+            # Consecutive inserts are concatenated in one go
+            pending.extend(entry["rows"])
+            continue
+        if pending:
+            df = _insert(df, pending)
+            pending = []
+        if entry["op"] == "delete" and "ids" in entry:
+            df = df.drop(df.index.intersection(entry["ids"]))
+        elif entry["op"] == "delete":
+            # Journals from before measurement ids delete by row position
+            positions = [pos for pos in entry["rows"] if pos < len(df)]
+            df = df.drop(df.index[positions])
+        elif entry["op"] == "update":
+            df = apply_changes(df, entry["changes"])
+    if pending:
+        df = _insert(df, pending)
+    return df
+
+
+def _remove_journal(path):
+    with contextlib.suppress(FileNotFoundError):
+        os.remove(journal_path(path))
+
+
+def _cut_journal(offset, path):
+    # Drops the first 'offset' bytes, which are merged into the store; caller
+    # holds the lock
+    try:
+        with open(journal_path(path), "rb") as journal:
+            journal.seek(offset)
+            rest = journal.read()
+    except FileNotFoundError:
+        return
+    if not rest:
+        return _remove_journal(path)
+    tmp_path = f"{journal_path(path)}.tmp"
+    with open(tmp_path, "wb") as journal:
+        journal.write(rest)
+        journal.flush()
+        os.fsync(journal.fileno())
+    os.replace(tmp_path, journal_path(path))
+
+
+def _read_consistent(path):
+    # Store and journal without the lock, retried when the store was replaced
+    # in between (the journal would then belong to another store)
+    while True:
+        store = store_state(path)
+        df = read_store(path)
+        entries, offset = read_journal_from(0, path)
+        if store_state(path) == store:
+            return df, entries, offset, store
+
+
+def compact(path=DATA_FILE):
+    # Merge the journal into the store and keep only what was appended since.
+    # The new store is built without the lock; writers only wait for the
+    # rename of the store and the cut of the journal.
+    df, entries, offset, store = _read_consistent(path)
+    df = apply_journal(df, entries)
+    tmp_path = _write_tmp(df, path, f"{path}.{new_id()}.tmp")
+    with _locked(path):
+        if store_state(path) != store:
+            # Another compaction or a replace_store came first
+            os.remove(tmp_path)
+            return load(path, excel_file=None)
+        os.replace(tmp_path, path)
+        _cut_journal(offset, path)
+    return df
+
+
+_compacties = {}   # path -> background compaction thread
+_compacties_lock = threading.Lock()
+
+
+def _compact_while_large(path):
+    # Writes during a compaction may take the journal past the limit again
+    while journal_size(path) > COMPACT_BYTES:
+        compact(path)
+
+
+def compact_in_background(path=DATA_FILE):
+    # At most one per store in this process; another process compacting at the
+    # same time loses the race in compact and reloads
+    with _compacties_lock:
+        thread = _compacties.get(path)
+        if thread is None or not thread.is_alive():
+            thread = threading.Thread(target=_compact_while_large, args=(path,), name="compactie", daemon=True)
+            _compacties[path] = thread
+            thread.start()
+        return thread
+
+
+def iter_range(start, end, path=DATA_FILE, batch_rows=50_000, voortgang=None):
+    # Current rows with 'Datum' from the start of 'start' up to and including the
+    # day 'end', as DataFrames of at most batch_rows rows. The store is read one
+    # record batch at a time, so memory use does not grow with the date range.
+    # voortgang(fraction) is called after every batch of the store.
+    van = pd.Timestamp(start).normalize()
+    tot = pd.Timestamp(end).normalize() + pd.Timedelta(days=1)
+    if os.path.exists(path) and not store_has_ids(path):
+        compact(path)
+    # The store is opened and the journal read under the shared lock, like in
+    # load_with_state; the open file keeps the store that belongs to this
+    # journal, also when a compaction replaces it while the batches stream
+    with _locked(path, shared=True):
+        store = pq.ParquetFile(path) if os.path.exists(path) else None
+        entries = read_journal(path)
+    # Deletes and updates of store rows are keyed on id, so they can be applied
+    # per batch; inserted rows (with their own later changes) come last
+    wijzigingen = [entry for entry in entries if entry["op"] != "insert"]
+    # Left in the store by a compaction that did not get to cut the journal
+    ingevoegd_ids = pd.Index([row[ID_COLUMN] for entry in entries if entry["op"] == "insert" for row in entry["rows"]])
+
+    def in_range(df):
+        return df[(df['Datum'] >= van) & (df['Datum'] < tot)]
+
+    if store is not None:
+        totaal = max(1, store.metadata.num_rows)
+        gelezen = 0
+        for batch in store.iter_batches(batch_size=batch_rows):
+            gelezen += batch.num_rows
+            df = with_ids(normalize_frame(batch.to_pandas()))
+            df = apply_journal(df.drop(df.index.intersection(ingevoegd_ids)), wijzigingen)
+            df = in_range(df)
+            if not df.empty:
+                yield df
+            if voortgang:
+                voortgang(gelezen / totaal)
+    # One insert entry at a time, collected up to batch_rows rows in range
+    buffer, aantal = [], 0
+    for entry in entries + [None]:
+        if entry is not None:
+            if entry["op"] != "insert":
+                continue
+            df = in_range(apply_journal(empty_frame(), [entry] + wijzigingen))
+            if df.empty:
+                continue
+            buffer.append(df)
+            aantal += len(df)
+        if buffer and (aantal >= batch_rows or entry is None):
+            ingevoegd = pd.concat(buffer)
+            for pos in range(0, len(ingevoegd), batch_rows):
+                yield ingevoegd.iloc[pos:pos + batch_rows]
+            buffer, aantal = [], 0
+
+
+def journal_size(path=DATA_FILE):
+    try:
+        return os.path.getsize(journal_path(path))
+    except FileNotFoundError:
+        return 0
+
+
+def store_state(path=DATA_FILE):
+    # (mtime, size) of the store; changes only when the store is rewritten
+    try:
+        store = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return (store.st_mtime_ns, store.st_size)
+
+
+def data_version(path=DATA_FILE):
+    # Changes with every write: compaction replaces the store, every other write
+    # appends to the journal (which only grows until the next compaction)
+    return (store_state(path), journal_size(path))
+
+
+class LoadState(NamedTuple):
+    store: tuple          # store_state() of the store that was read
+    journal_offset: int   # journal bytes applied, see read_journal_from
+
+
+def load(path=DATA_FILE, excel_file=EXCEL_FILE):
+    return load_with_state(path, excel_file)[0]
+
+
+def load_with_state(path=DATA_FILE, excel_file=EXCEL_FILE):
+    # The dataset plus what it was built from, so a refresh can later read only
+    # the journal entries appended since
+    # First run on an existing installation: import the workbook once
+    if not os.path.exists(path) and excel_file and os.path.exists(excel_file):
+        migrate_excel([excel_file], path)
+    # Stores from before measurement ids: assign them once and persist them
+    elif os.path.exists(path) and not store_has_ids(path):
+        compact(path)
+    # Loading already costs a full read, so that is when a large journal is merged
+    elif journal_size(path) > COMPACT_BYTES:
+        compact(path)
+    # A compaction between reading the store and the journal would replay the
+    # old journal on the new store
+    with _locked(path, shared=True):
+        store = store_state(path)
+        df = read_store(path)
+        entries, offset = read_journal_from(0, path)
+    return apply_journal(df, entries), LoadState(store, offset)
+
+
+# ---------- Command line ----------
+# python datastore.py migrate Waterkwaliteit.xlsx [meer.xlsx ...] [--dedupe]
+# python datastore.py export export.xlsx
+# python datastore.py compact            (writes start one in the background past COMPACT_BYTES)
+# With --data-file metingen.sqlite the same commands work on the SQLite backend.
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Beheer van de waterkwaliteit data store")
+    parser.add_argument("--data-file", default=DATA_FILE, help="Pad naar de Parquet store of SQLite database")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    migrate = commands.add_parser("migrate", help="Excel-bestanden eenmalig importeren")
+    migrate.add_argument("excel_files", nargs="+")
+    migrate.add_argument("--dedupe", action="store_true", help="Dubbele rijen verwijderen")
+
+    export = commands.add_parser("export", help="Store exporteren naar Excel")
+    export.add_argument("excel_file")
+
+    commands.add_parser("compact", help="Journal samenvoegen met de store")
+
+    commands.add_parser("memory", help="Geheugengebruik per kolom, in de store en in de dashboards")
+
+    args = parser.parse_args(argv)
+    store = backend(args.data_file)
+    if args.command == "migrate":
+        df = store.migrate_excel(args.excel_files, args.data_file, dedupe=args.dedupe)
+        print(f"{len(df)} metingen opgeslagen in {args.data_file}")
+    elif args.command == "export":
+        df = store.load(args.data_file, excel_file=None)
+        write_excel(df, args.excel_file)
+        print(f"{len(df)} metingen geëxporteerd naar {args.excel_file}")
+    elif args.command == "compact":
+        df = store.compact(args.data_file)
+        print(f"Journal samengevoegd, {len(df)} metingen in {args.data_file}")
+    elif args.command == "memory":
+        import preprocessing  # imports this module
+        df = store.load(args.data_file, excel_file=None)
+        store_mb = preprocessing.memory_report(df)
+        dashboard_mb = preprocessing.memory_report(preprocessing.prepare_frame(df.copy()))
+        report = store_mb.join(dashboard_mb, how='outer', lsuffix=' store', rsuffix=' dashboard')
+        print(report.sort_values('MB dashboard', ascending=False).to_string(float_format="{:.3f}".format, na_rep="-"))
+        print(f"Totaal: {store_mb['MB'].sum():.3f} MB als geladen, {dashboard_mb['MB'].sum():.3f} MB in de dashboards")
+
+
+if __name__ == "__main__":
+    main()
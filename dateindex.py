@@ -0,0 +1,55 @@
+from typing import NamedTuple
+
+import numpy as np
+import pandas as pd
+
+# ---------- Datumindex ----------
+# Row positions sorted on 'Datum', built once per dataset version. Day and
+# date-range filters become two binary searches plus a slice instead of a
+# boolean mask over the whole frame on every rerun.
+
+
+class DateIndex(NamedTuple):
+    order: np.ndarray        # row positions sorted on Datum (rows without a date left out)
+    dates: np.ndarray        # Datum values in that order, datetime64[ns]
+    days: pd.DatetimeIndex   # the days that actually have measurements
+
+
+def build_date_index(df):
+    datum = df['Datum'].to_numpy(dtype='datetime64[ns]')
+    positions = np.flatnonzero(~np.isnat(datum))
+    order = positions[np.argsort(datum[positions], kind='stable')]
+    dates = datum[order]
+    days = pd.DatetimeIndex(np.unique(dates.astype('datetime64[D]')))
+    return DateIndex(order, dates, days)
+
+
+def _day_start(day):
+    return np.datetime64(pd.Timestamp(day).normalize(), 'ns')
+
+
+def range_positions(index, start, end):
+    # Positions of all rows from the start of 'start' up to and including the day 'end'
+    lo = np.searchsorted(index.dates, _day_start(start), side='left')
+    hi = np.searchsorted(index.dates, _day_start(end) + np.timedelta64(1, 'D'), side='left')
+    return index.order[lo:hi]
+
+
+def range_rows(df, index, start, end):
+    return df.iloc[range_positions(index, start, end)]
+
+
+def day_rows(df, index, day):
+    return range_rows(df, index, day, day)
+
+
+def adjacent_day(index, day, step):
+    # Previous (step < 0) or next (step > 0) day with measurements, None at the ends
+    day = pd.Timestamp(day).normalize()
+    if step < 0:
+        pos = index.days.searchsorted(day, side='left') - 1
+    else:
+        pos = index.days.searchsorted(day, side='right')
+    if 0 <= pos < len(index.days):
+        return index.days[pos].date()
+    return None
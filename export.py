@@ -0,0 +1,274 @@
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+import xlsxwriter
+
+import datastore
+
+# ---------- Data exporteren ----------
+# Exports stream the selected date range from the store into a temporary file,
+# one batch at a time, instead of building the whole file in memory. The
+# dashboards start an ExportJob with submit_export when somebody asks for a
+# file; it is built in the background (and cached, see ExportCache) and the
+# download button appears once the job is done.
+
+FORMATEN = {
+    'Excel': ('xlsx', "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"),
+    'CSV': ('csv', "text/csv"),
+    'Parquet': ('parquet', "application/octet-stream"),
+}
+
+# Rows per sheet; Excel cannot hold more than 1,048,576 rows including the header
+EXCEL_MAX_RIJEN = 1_048_575
+
+# Total size of the generated files kept in memory, see ExportCache
+EXPORT_CACHE_BYTES = int(os.environ.get("WATERKWALITEIT_EXPORT_CACHE_MB", 256)) * 1024 * 1024
+
+# Exports that are built at the same time, see submit_export
+EXPORT_WORKERS = int(os.environ.get("WATERKWALITEIT_EXPORT_WORKERS", 2))
+
+
+def export_columns(chunk):
+    # The store columns with the id first, without the derived map columns
+    return [datastore.ID_COLUMN] + [col for col in chunk.columns if col != datastore.ID_COLUMN]
+
+
+def _rows(chunk):
+    # Plain Python values for xlsxwriter: NaN/NaT become empty cells
+    values = chunk.astype(object).where(chunk.notna(), None)
+    return values.itertuples(index=False, name=None)
+
+
+def write_excel(chunks, target):
+    # constant_memory flushes every row to disk as soon as the next one is written
+    workbook = xlsxwriter.Workbook(target, {
+        'constant_memory': True,
+        'default_date_format': 'dd-mm-yyyy',
+        'nan_inf_to_errors': True,
+    })
+    worksheet = None
+    kolommen = None
+    rij = 0
+    for chunk in chunks:
+        chunk = chunk.reset_index()
+        if kolommen is None:
+            kolommen = export_columns(chunk)
+        for values in _rows(chunk.reindex(columns=kolommen)):
+            if worksheet is None or rij > EXCEL_MAX_RIJEN:
+                worksheet = workbook.add_worksheet()
+                worksheet.write_row(0, 0, kolommen)
+                rij = 1
+            worksheet.write_row(rij, 0, values)
+            rij += 1
+    if worksheet is None:
+        workbook.add_worksheet()
+    workbook.close()
+
+
+def write_csv(chunks, target):
+    kolommen = None
+    with open(target, "w", encoding="utf-8", newline="") as f:
+        for chunk in chunks:
+            chunk = chunk.reset_index()
+            header = kolommen is None
+            if header:
+                kolommen = export_columns(chunk)
+            chunk.reindex(columns=kolommen).to_csv(f, header=header, index=False, date_format="%Y-%m-%d")
+        if kolommen is None:
+            f.write(",".join([datastore.ID_COLUMN] + datastore.COLUMNS) + "\n")
+
+
+def _conform(chunk, schema):
+    # Every batch gets the types of the first one: free-text columns stay text,
+    # numeric columns stay numeric, also for batches of journal inserts
+    for veld in schema:
+        values = chunk[veld.name]
+        if pa.types.is_string(veld.type):
+            chunk[veld.name] = values.where(values.isna(), values.astype(str))
+        elif pa.types.is_integer(veld.type) or pa.types.is_floating(veld.type):
+            chunk[veld.name] = pd.to_numeric(values, errors='coerce')
+    return chunk
+
+
+def write_parquet(chunks, target):
+    writer = None
+    try:
+        for chunk in chunks:
+            chunk = chunk.reset_index()
+            if writer is None:
+                kolommen = export_columns(chunk)
+                eerste = datastore._arrow_safe(chunk.reindex(columns=kolommen))
+                schema = pa.Schema.from_pandas(eerste, preserve_index=False)
+                # Columns that are empty in the first batch get a usable type
+                schema = pa.schema([
+                    pa.field(veld.name, pa.string()) if pa.types.is_null(veld.type) else veld
+                    for veld in schema
+                ]).remove_metadata()
+                writer = pq.ParquetWriter(target, schema)
+            chunk = _conform(chunk.reindex(columns=kolommen), schema)
+            writer.write_table(pa.Table.from_pandas(chunk, schema=schema, preserve_index=False, safe=False))
+    finally:
+        if writer is not None:
+            writer.close()
+    if writer is None:
+        datastore.write_store(datastore.empty_frame(), target)
+
+
+SCHRIJVERS = {
+    'xlsx': write_excel,
+    'csv': write_csv,
+    'parquet': write_parquet,
+}
+
+
+def export_range(start, end, extensie, target, path=datastore.DATA_FILE, voortgang=None):
+    SCHRIJVERS[extensie](datastore.backend(path).iter_range(start, end, path, voortgang=voortgang), target)
+
+
+def export_file(start, end, formaat='Excel', path=datastore.DATA_FILE, voortgang=None):
+    # Streamlit keeps a download in memory itself, so only the finished (and for
+    # xlsx/parquet compressed) file is read back; the rows never are all at once
+    extensie, _ = FORMATEN[formaat]
+    fd, target = tempfile.mkstemp(suffix=f".{extensie}")
+    os.close(fd)
+    try:
+        export_range(start, end, extensie, target, path, voortgang)
+        with open(target, "rb") as f:
+            return f.read()
+    finally:
+        os.remove(target)
+
+
+def file_name(start, end, formaat='Excel'):
+    extensie, _ = FORMATEN[formaat]
+    return f"waterkwaliteit_{pd.Timestamp(start).strftime('%Y%m%d')}_tot_{pd.Timestamp(end).strftime('%Y%m%d')}.{extensie}"
+
+
+# ---------- Cache van exportbestanden ----------
+class ExportCache:
+    # Generated files keyed on (start, end, format, data version), least
+    # recently used first out once the total size passes max_bytes. One cache
+    # is shared by all sessions of the server process; when two sessions ask
+    # for the same file at the same time, the second waits for the first build.
+
+    def __init__(self, max_bytes=EXPORT_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self._bestanden = OrderedDict()
+        self._bezig = {}
+        self._lock = threading.Lock()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get_or_build(self, key, build):
+        with self._lock:
+            bestand = self._bestanden.get(key)
+            if bestand is not None:
+                self.hits += 1
+                self._bestanden.move_to_end(key)
+                return bestand
+            bouw_lock = self._bezig.setdefault(key, threading.Lock())
+        with bouw_lock:
+            with self._lock:
+                bestand = self._bestanden.get(key)
+                if bestand is not None:  # built by another session meanwhile
+                    self.hits += 1
+                    return bestand
+            try:
+                bestand = build()
+            except BaseException:
+                with self._lock:
+                    self._bezig.pop(key, None)
+                raise
+            with self._lock:
+                self.misses += 1
+                self._store(key, bestand)
+                # Only after the store: a session arriving in between would
+                # otherwise find neither the file nor this build, and build again
+                self._bezig.pop(key, None)
+            return bestand
+
+    def _store(self, key, bestand):
+        if len(bestand) > self.max_bytes:
+            return  # would evict everything else; served once, not kept
+        self._bestanden[key] = bestand
+        self.bytes += len(bestand)
+        while self.bytes > self.max_bytes:
+            _, oud = self._bestanden.popitem(last=False)
+            self.bytes -= len(oud)
+
+    def clear(self):
+        with self._lock:
+            self._bestanden.clear()
+            self.bytes = 0
+
+
+EXPORT_CACHE = ExportCache()
+
+
+def cached_export_file(start, end, formaat='Excel', path=datastore.DATA_FILE, cache=EXPORT_CACHE, voortgang=None):
+    # Any write changes the data version, so a cached file is never stale
+    key = (
+        pd.Timestamp(start).date(),
+        pd.Timestamp(end).date(),
+        formaat,
+        os.path.abspath(path),
+        datastore.backend(path).data_version(path),
+    )
+    return cache.get_or_build(key, lambda: export_file(start, end, formaat, path, voortgang))
+
+
+# ---------- Exports op de achtergrond ----------
+# A job runs in a thread of the server process, so the script (and with it the
+# map and the other tabs) is not blocked while the file is built. The job object
+# lives in the session state and survives reruns of that session.
+_POOL = ThreadPoolExecutor(max_workers=EXPORT_WORKERS, thread_name_prefix="export")
+
+
+class ExportJob:
+
+    def __init__(self, start, end, formaat, path):
+        self.start = start
+        self.end = end
+        self.formaat = formaat
+        self.path = path
+        self.voortgang = 0.0
+        self.future = None
+
+    def _set_voortgang(self, fraction):
+        self.voortgang = min(fraction, 1.0)
+
+    def _run(self):
+        bestand = cached_export_file(self.start, self.end, self.formaat, self.path, voortgang=self._set_voortgang)
+        self.voortgang = 1.0
+        return bestand
+
+    def same_as(self, start, end, formaat):
+        return (self.start, self.end, self.formaat) == (start, end, formaat)
+
+    def done(self):
+        return self.future.done()
+
+    def error(self):
+        return self.future.exception() if self.done() else None
+
+    def result(self):
+        return self.future.result()
+
+    def file_name(self):
+        return file_name(self.start, self.end, self.formaat)
+
+    def mime(self):
+        return FORMATEN[self.formaat][1]
+
+
+def submit_export(start, end, formaat='Excel', path=datastore.DATA_FILE):
+    job = ExportJob(start, end, formaat, path)
+    job.future = _POOL.submit(job._run)
+    return job
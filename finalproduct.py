@@ -1,84 +1,117 @@
 import streamlit as st
 import pandas as pd
-import folium
 from streamlit_folium import st_folium
 import re
 
+import datastore
+import dateindex
+import importer
+import management
+import mapview
+import preprocessing
+import rollups
+import shareddata
+import stations
+
 st.set_page_config(layout="wide")
 
-# Define the file path for your data
-DATA_FILE = "Waterkwaliteit.xlsx" # Or "Waterkwaliteit.csv" if you prefer CSV
+# Define the file path for your data (see datastore.py, Excel is import/export only)
+DATA_FILE = datastore.DATA_FILE
 
 # ---------- 1. Data inladen ----------
-@st.cache_data
-def load_data():
-    try:
-        df = pd.read_excel(DATA_FILE)
-        
-        # Spaties verwijderen uit kolomnamen
-        df.columns = df.columns.str.strip()
-
-        # Ensure 'Meetdag' exists and is converted to datetime
-        if 'Meetdag' in df.columns:
-            df['Meetdag'] = pd.to_datetime(df['Meetdag'], dayfirst=True, errors='coerce')
+# One dataset per server process, shared by all sessions (see shareddata.py);
+# the store is read and prepared once, not once per session
+@st.cache_resource
+def get_dataset():
+    return shareddata.SharedDataset(DATA_FILE)
+
+# Built maps per (day, waardes), only the days touched by a write are dropped
+def get_map_cache():
+    if 'kaart_cache' not in st.session_state:
+        st.session_state['kaart_cache'] = mapview.MapCache()
+    return st.session_state['kaart_cache']
+
+# The session only remembers which version it saw; maps of the days that any
+# session changed since then are dropped from this session's map cache
+def get_data():
+    dataset = get_dataset()
+    snapshot = dataset.refresh()
+    gezien = st.session_state.get('data_versie')
+    if gezien is not None and gezien != snapshot.versie:
+        dagen = dataset.changed_days(gezien)
+        if dagen is None:
+            get_map_cache().clear()
         else:
-            # If 'Meetdag' is missing, create it as a dummy column or handle as appropriate
-            # For now, let's create it with NaT (Not a Time) values if missing
-            df['Meetdag'] = pd.NaT 
-
-        # Ensure 'Datum' column exists. If it exists, convert it. If not, create from 'Meetdag'.
-        if 'Datum' in df.columns:
-            df['Datum'] = pd.to_datetime(df['Datum'], dayfirst=True, errors='coerce')
-        elif 'Meetdag' in df.columns: # If 'Datum' is missing but 'Meetdag' exists, use 'Meetdag'
-            df['Datum'] = df['Meetdag']
-        else: # If both are missing, create 'Datum' with NaT values
-            df['Datum'] = pd.NaT
-
-    except FileNotFoundError:
-        # Create an empty DataFrame with ALL expected columns, including 'Datum' and 'Meetdag'
-        # This is crucial for consistency when the file doesn't exist yet.
-        columns = [
-            'Locatie', 'Meetdag', 'Datum', 'Coordinaten', 'PH', 'Temperatuur',
-            'ORP', 'EC', 'CF', 'TDS', 'Humidity', 'Buitentemperatuur'
-        ]
-        df = pd.DataFrame(columns=columns)
-        
-        # Ensure date columns are of datetime type even in an empty DataFrame
-        df['Meetdag'] = pd.to_datetime(df['Meetdag'])
-        df['Datum'] = pd.to_datetime(df['Datum'])
-        
-    return df
+            get_map_cache().invalidate(dagen)
+    st.session_state['data_versie'] = snapshot.versie
+    return snapshot.data
 
 # Function to save data
-def save_data(df_to_save):
+def save_data(nieuwe_metingen=None, verwijderde_ids=None, wijzigingen=None):
+    # The change is appended to the journal, keyed on 'meting_id', and published
+    # to all sessions as a new snapshot; returns the (new) current data
+    dataset = get_dataset()
     try:
-        df_to_save.to_excel(DATA_FILE, index=False)
+        if nieuwe_metingen:
+            dataset.insert(nieuwe_metingen)
+        if verwijderde_ids:
+            dataset.delete(verwijderde_ids)
+        if wijzigingen:
+            dataset.update(wijzigingen)
         st.success("Data succesvol opgeslagen!")
     except Exception as e:
         st.error(f"Fout bij opslaan van data: {e}")
-
-# Data initialiseren en opslaan in session_state zodat we ze kunnen uitbreiden
-if 'data' not in st.session_state:
-    st.session_state['data'] = load_data()
-
-df = st.session_state['data']
-
-# --- Add a button to refresh data if using @st.cache_data ---
-st.sidebar.button('Ververs Data', on_click=load_data.clear) # This clears the cache for load_data
+    return dataset.snapshot().data
+
+# New measurements from the sensors (ingest.py) or other sessions are announced
+# here; the page itself only reruns when the user wants to see them
+@st.fragment(run_every=shareddata.VERVERS_SECONDEN)
+def meld_nieuwe_data():
+    if get_dataset().refresh().versie != st.session_state.get('data_versie'):
+        st.info("Er zijn nieuwe metingen binnengekomen.")
+        if st.button("Nieuwe metingen laden"):
+            st.rerun()
+
+# Date index of a snapshot, built once and shared by all sessions
+def get_date_index(data):
+    return get_dataset().date_index(data)
+
+# Jump the date picker to the previous/next day that has measurements
+def spring_naar_meetdag(stap):
+    dag = dateindex.adjacent_day(get_date_index(get_data()), st.session_state['datum_selectie'], stap)
+    if dag is not None:
+        st.session_state['datum_selectie'] = dag
+
+df = get_data()
+
+with st.sidebar:
+    meld_nieuwe_data()
+    # Footprint of the shared dataset and of the caches
+    if st.toggle("Geheugengebruik tonen"):
+        geheugen = preprocessing.memory_report(df)
+        st.caption(f"Gedeelde dataset: {len(df)} metingen, {geheugen['MB'].sum():.1f} MB")
+        st.dataframe(geheugen, column_config={'MB': st.column_config.NumberColumn(format="%.2f")})
+        st.caption(f"Kaarten in de cache van deze sessie: {len(get_map_cache())}")
+
+# Merges what was written since the last load (other processes, command line);
+# the whole store is only re-read when it was rewritten
+st.sidebar.button('Ververs Data', on_click=get_dataset().refresh)
 
 # Tabs aanmaken
-tab1, tab2, tab3 = st.tabs(["🗺️ Kaart", "➕ Nieuwe meting", "⚙️ Metingen beheren"])
+tab1, tab2, tab3, tab4 = st.tabs(["🗺️ Kaart", "➕ Nieuwe meting", "⚙️ Metingen beheren", "📈 Trends"])
 
 with tab1:
     # ---------- Sidebar filters (kun je ook hier plaatsen voor betere UX) ----------
     st.sidebar.header("Filter opties")
     
-    # Ensure 'Datum' column has valid datetime objects before finding min
-    if not df['Datum'].dropna().empty:
-        datum_selectie = st.sidebar.date_input("Kies meetdag", df['Datum'].min())
-    else:
-        # Provide a default date if no valid dates are found
-        datum_selectie = st.sidebar.date_input("Kies meetdag", pd.to_datetime('today'))
+    # Default to the first day that actually has measurements
+    meetdagen = get_date_index(df).days
+    if 'datum_selectie' not in st.session_state:
+        st.session_state['datum_selectie'] = meetdagen[0].date() if len(meetdagen) else pd.to_datetime('today').date()
+    datum_selectie = st.sidebar.date_input("Kies meetdag", key='datum_selectie')
+    col_vorige, col_volgende = st.sidebar.columns(2)
+    col_vorige.button("◀ Vorige", on_click=spring_naar_meetdag, args=(-1,))
+    col_volgende.button("Volgende ▶", on_click=spring_naar_meetdag, args=(1,))
 
 
     waardes = st.sidebar.multiselect(
@@ -88,48 +121,100 @@ with tab1:
     )
 
     # Filter op geselecteerde datum
-    filtered_df = df[df['Datum'] == pd.to_datetime(datum_selectie)]
+    filtered_df = get_dataset().day_rows(df, datum_selectie)
 
     st.title("🌊 Waterkwaliteit in Amsterdam")
-    st.markdown(f"### Meetpunten op {datum_selectie.strftime('%d-%m-%Y')}")
-
-    kaart = folium.Map(location=[52.36, 4.9], zoom_start=13)
-
-    for _, row in filtered_df.iterrows():
-        popup_text = f"<b>{row['Locatie']}</b><br>"
-        for col in waardes:
-            if col in row and pd.notna(row[col]):
-                popup_text += f"{col}: {row[col]}<br>"
-
-        try:
-            # Ensure 'Coordinaten' is a string before splitting
-            coords_str = str(row['Coordinaten'])
-            lat_str, lon_str = re.split(r',\s*', coords_str)
-            lat = float(lat_str)
-            lon = float(lon_str)
-        except (ValueError, TypeError): # Handle cases where split fails or conversion to float fails
-            continue
-
-        kleur = "gray"
-        try:
-            # Ensure 'PH' is a string and handle potential comma as decimal separator
-            ph_val = float(str(row['PH']).replace(',', '.'))
-            if 6.5 <= ph_val <= 8.5:
-                kleur = "green"
-            elif 5.5 <= ph_val < 6.5 or 8.5 < ph_val <= 9.5:
-                kleur = "orange"
-            else:
-                kleur = "red"
-        except (ValueError, TypeError): # Handle cases where PH value is not convertible
-            kleur = "gray"
+    kaart_weergave = st.sidebar.radio(
+        "Kaartweergave", ["Folium", "WebGL"], horizontal=True,
+        help="WebGL (pydeck) tekent ook 100.000+ meetpunten vloeiend; zonder achtergrondkaart van Mapbox, dus ook offline."
+    )
+    alleen_zichtbaar = st.sidebar.checkbox(
+        "Alleen zichtbaar gebied laden", value=True,
+        help="Alleen de meetpunten in beeld (plus een rand) gaan naar de kaart, uitgedund bij ver uitzoomen; na verschuiven of zoomen wordt de kaart bijgewerkt."
+    )
+    tijdlijn = st.sidebar.checkbox(
+        "Tijdlijn afspelen",
+        help="Alle meetdagen van een periode in één kaart: met de schuifregelaar op de kaart blader je door de dagen zonder dat de pagina opnieuw laadt."
+    )
+    if tijdlijn:
+        if 'tijdlijn_periode' not in st.session_state:
+            st.session_state['tijdlijn_periode'] = (
+                datum_selectie, (pd.Timestamp(datum_selectie) + pd.Timedelta(days=mapview.TIJDLIJN_DAGEN - 1)).date()
+            )
+        periode = st.sidebar.date_input("Periode van de tijdlijn", key='tijdlijn_periode')
+        tijdlijn_van, tijdlijn_tot = (periode[0], periode[-1]) if periode else (datum_selectie, datum_selectie)
+        laatste_dag = (pd.Timestamp(tijdlijn_van) + pd.Timedelta(days=mapview.TIJDLIJN_MAX_DAGEN - 1)).date()
+        if tijdlijn_tot > laatste_dag:
+            st.sidebar.caption(f"De tijdlijn toont maximaal {mapview.TIJDLIJN_MAX_DAGEN} dagen.")
+            tijdlijn_tot = laatste_dag
+        st.markdown(f"### Meetpunten van {tijdlijn_van.strftime('%d-%m-%Y')} t/m {tijdlijn_tot.strftime('%d-%m-%Y')}")
+    else:
+        st.markdown(f"### Meetpunten op {datum_selectie.strftime('%d-%m-%Y')}")
 
-        folium.Marker(
-            location=[lat, lon],
-            popup=folium.Popup(popup_text, max_width=300),
-            icon=folium.Icon(color=kleur)
-        ).add_to(kaart)
+    details_bij_klik = st.sidebar.checkbox(
+        "Meetwaarden pas tonen bij klikken", value=True,
+        help="Snellere kaart: de markers bevatten geen popup, de waardes van het aangeklikte meetpunt verschijnen onder de kaart."
+    )
 
-    st_folium(kaart, width=900, height=600)
+    # Individual markers, or client-side clusters above mapview.CLUSTER_DREMPEL points.
+    # The time line holds every day of the period; the slider runs in the browser.
+    if tijdlijn:
+        kaart = get_map_cache().get_or_build_range(
+            tijdlijn_van, tijdlijn_tot, ('tijdlijn',) + tuple(waardes),
+            lambda: mapview.build_time_map(get_dataset().range_rows(df, tijdlijn_van, tijdlijn_tot), waardes)
+        )
+        st_folium(mapview.fresh_root(kaart), width=900, height=600, returned_objects=[])
+    elif kaart_weergave == "WebGL":
+        deck_map = get_map_cache().get_or_build(
+            datum_selectie, 'webgl', lambda: mapview.build_deck_map(filtered_df)
+        )
+        gebeurtenis = st.pydeck_chart(
+            deck_map.deck, height=600, on_select="rerun", selection_mode="single-object",
+            key=f"deck_{datum_selectie}"
+        )
+        geselecteerd = mapview.selected_measurements(deck_map, gebeurtenis.selection)
+        if geselecteerd.empty:
+            st.caption("Klik op een meetpunt om de meetwaarden te zien.")
+        else:
+            st.dataframe(geselecteerd[['Locatie', 'Datum'] + waardes], hide_index=True)
+    elif alleen_zichtbaar:
+        ruimtelijk = get_map_cache().get_or_build(
+            datum_selectie, 'ruimtelijk', lambda: mapview.build_viewport_index(filtered_df)
+        )
+        zichtbaar = mapview.viewport_positions(ruimtelijk, mapview.folium_viewport(st.session_state.get('viewport_kaart')))
+        if 'viewport_basiskaart' not in st.session_state:
+            st.session_state['viewport_basiskaart'] = mapview.build_base_map()
+        kaart_data = st_folium(
+            mapview.fresh_root(st.session_state['viewport_basiskaart']), width=900, height=600,
+            feature_group_to_add=mapview.viewport_layer(ruimtelijk, zichtbaar, waardes, details_bij_klik),
+            returned_objects=["bounds", "zoom"] + (["last_object_clicked"] if details_bij_klik else []),
+            key='viewport_kaart'
+        )
+        st.caption(f"{len(zichtbaar)} van {len(ruimtelijk.punten)} meetpunten op de kaart")
+        if details_bij_klik:
+            geselecteerd = mapview.viewport_clicked(ruimtelijk, (kaart_data or {}).get("last_object_clicked"))
+            if geselecteerd.empty:
+                st.caption("Klik op een meetpunt om de meetwaarden te zien.")
+            else:
+                st.dataframe(geselecteerd[['Locatie', 'Datum'] + waardes], hide_index=True)
+    elif details_bij_klik:
+        click_map = get_map_cache().get_or_build(
+            datum_selectie, 'klik', lambda: mapview.build_click_map(filtered_df)
+        )
+        kaart_data = st_folium(
+            mapview.fresh_root(click_map.kaart), width=900, height=600,
+            returned_objects=["last_object_clicked"]
+        )
+        geselecteerd = mapview.clicked_measurements(click_map, (kaart_data or {}).get("last_object_clicked"))
+        if geselecteerd.empty:
+            st.caption("Klik op een meetpunt om de meetwaarden te zien.")
+        else:
+            st.dataframe(geselecteerd[['Locatie', 'Datum'] + waardes], hide_index=True)
+    else:
+        kaart = get_map_cache().get_or_build(
+            datum_selectie, tuple(waardes), lambda: mapview.build_map(filtered_df, waardes)
+        )
+        st_folium(mapview.fresh_root(kaart), width=900, height=600, returned_objects=[])
 
 with tab2:
     st.header("Nieuwe meting toevoegen")
@@ -164,6 +249,7 @@ with tab2:
 
                     # Create a new row
                     nieuwe_meting = {
+                        'meting_id': datastore.new_id(),
                         'Locatie': locatie,
                         'Meetdag': pd.Timestamp(datum), # Keep 'Meetdag' consistent with 'Datum' if they represent the same
                         'Datum': pd.Timestamp(datum),
@@ -178,13 +264,8 @@ with tab2:
                         'Buitentemperatuur': buitentemperatuur,
                     }
 
-                    # Expand DataFrame and save to session_state
-                    df = st.session_state['data']
-                    updated_df = pd.concat([df, pd.DataFrame([nieuwe_meting])], ignore_index=True)
-                    st.session_state['data'] = updated_df
-
-                    # Save the updated DataFrame back to the Excel file
-                    save_data(updated_df)
+                    # Append the new measurement to the store's journal; all sessions see it
+                    df = save_data(nieuwe_metingen=stations.snap_rows([nieuwe_meting]))
                     st.success("Nieuwe meting toegevoegd en opgeslagen! Ga terug naar tab 'Kaart' om de update te zien.")
                     
                 except ValueError:
@@ -192,39 +273,132 @@ with tab2:
                 except Exception as e:
                     st.error(f"Er is een onverwachte fout opgetreden: {e}")
 
+    st.markdown("---")
+    st.subheader("Meerdere metingen importeren")
+    # All rows are checked at once; the accepted ones are saved in one write
+    upload = st.file_uploader("CSV- of Excel-bestand met metingen", type=importer.IMPORT_TYPES, key='import_bestand')
+    if upload is not None:
+        # Read and validated once per uploaded file, not on every rerun
+        validatie = st.session_state.get('import_validatie')
+        if validatie is None or validatie[0] != upload.file_id:
+            try:
+                validatie = (upload.file_id,) + importer.validate(importer.read_upload(upload, upload.name))
+            except Exception as e:
+                validatie = (upload.file_id, e)
+            st.session_state['import_validatie'] = validatie
+        geimporteerd = st.session_state.setdefault('geimporteerde_bestanden', set())
+        if isinstance(validatie[1], Exception):
+            st.error(f"Bestand kon niet worden gelezen: {validatie[1]}")
+        else:
+            _, geaccepteerd, afgekeurd_import = validatie
+            st.write(f"{len(geaccepteerd)} meting(en) goedgekeurd, {len(afgekeurd_import)} afgekeurd.")
+            if not afgekeurd_import.empty:
+                with st.expander(f"Afgekeurde rijen ({len(afgekeurd_import)})"):
+                    st.dataframe(afgekeurd_import)
+            if upload.file_id in geimporteerd:
+                st.info("Dit bestand is al geïmporteerd.")
+            elif not geaccepteerd.empty and st.button(f"{len(geaccepteerd)} meting(en) importeren"):
+                versie = get_dataset().snapshot().versie
+                df = save_data(nieuwe_metingen=importer.to_rows(geaccepteerd))
+                # save_data reports a failed write itself; then the file may be imported again
+                if get_dataset().snapshot().versie != versie:
+                    geimporteerd.add(upload.file_id)
+                    st.success(f"{len(geaccepteerd)} meting(en) geïmporteerd!")
+
 with tab3:
     st.header("Metingen beheren")
 
-    if not st.session_state['data'].empty:
-        st.write("Selecteer de metingen die je wilt verwijderen:")
-        
-        # Display the DataFrame with a checkbox for each row
-        # We add a temporary index to allow easy selection and then remove by actual index
-        df_display = st.session_state['data'].reset_index()
-        df_display.rename(columns={'index': 'Originele Index'}, inplace=True)
-
-        selected_rows_indices = []
-        for i, row in df_display.iterrows():
-            col1, col2 = st.columns([0.1, 0.9])
-            with col1:
-                if st.checkbox(f"Selecteer", key=f"checkbox_{i}"):
-                    selected_rows_indices.append(row['Originele Index'])
-            with col2:
-                # Display relevant information for the user to identify the row
-                st.write(f"**Locatie:** {row['Locatie']} | **Datum:** {row['Datum'].strftime('%d-%m-%Y')} | **Coördinaten:** {row['Coordinaten']}")
-                st.write(f"PH: {row['PH']}, Temp: {row['Temperatuur']}")
-                st.write("---") # Separator for readability
-
-        if st.button("Geselecteerde metingen verwijderen"):
+    # Rows rejected at load time, e.g. because 'Coordinaten' could not be parsed
+    afgekeurd = get_dataset().rejected_rows(df)
+    if not afgekeurd.empty:
+        with st.expander(f"Afgekeurde rijen ({len(afgekeurd)})"):
+            st.write("Deze metingen hebben geen geldige coördinaten en worden niet op de kaart getoond:")
+            st.dataframe(afgekeurd)
+
+    if not df.empty:
+        data = df
+        meetdagen = get_date_index(data).days
+
+        # Filters are applied server-side; only the current page becomes widgets
+        col_datum, col_locatie = st.columns(2)
+        with col_datum:
+            filter_op_datum = st.checkbox("Filter op datum", key='beheer_filter_datum')
+            start_filter = eind_filter = None
+            if filter_op_datum and len(meetdagen):
+                start_filter = st.date_input("Van", value=meetdagen[0].date(), key='beheer_van')
+                eind_filter = st.date_input("Tot en met", value=meetdagen[-1].date(), key='beheer_tot')
+        with col_locatie:
+            locatie_namen = get_dataset().station_names(data)
+            locatie_filter = st.multiselect("Locatie", sorted(locatie_namen, key=locatie_namen.get), format_func=locatie_namen.get, key='beheer_locaties')
+
+        gefilterd = management.filter_rows(data, get_date_index(data), start_filter, eind_filter, locatie_filter)
+
+        col_grootte, col_pagina = st.columns(2)
+        pagina_grootte = col_grootte.selectbox("Metingen per pagina", management.PAGINA_GROOTTES, key='beheer_pagina_grootte')
+        aantal_paginas = management.page_count(len(gefilterd), pagina_grootte)
+        # The page only lives in the session state, so clamping it does not clash with a widget default
+        st.session_state.setdefault('beheer_pagina', 1)
+        if st.session_state['beheer_pagina'] > aantal_paginas:
+            st.session_state['beheer_pagina'] = aantal_paginas  # filter got narrower
+        pagina = col_pagina.number_input(f"Pagina (van {aantal_paginas})", min_value=1, max_value=aantal_paginas, key='beheer_pagina')
+
+        st.write(f"{len(gefilterd)} meting(en) gevonden. Selecteer de metingen die je wilt verwijderen:")
+        alles_selecteren = st.checkbox("Alle metingen op deze pagina selecteren", key='beheer_alles')
+
+        # One data_editor for the page instead of a checkbox and three writes per row;
+        # the frame keeps the 'meting_id' index so selections and edits map back to the data.
+        # Without a fixed key the editor starts fresh whenever the page content changes.
+        pagina_metingen = management.page(gefilterd, pagina, pagina_grootte)
+        bewerkt = st.data_editor(
+            management.editor_frame(pagina_metingen, alles_selecteren),
+            hide_index=True,
+            column_config={
+                'Verwijderen': st.column_config.CheckboxColumn("Verwijderen"),
+                'Datum': st.column_config.DateColumn("Datum", format="DD-MM-YYYY"),
+            },
+        )
+        selected_rows_indices = bewerkt.index[bewerkt['Verwijderen']].tolist()
+
+        col_verwijderen, col_opslaan = st.columns(2)
+        if col_opslaan.button("Wijzigingen opslaan"):
+            wijzigingen = management.changed_cells(pagina_metingen, bewerkt)
+            if wijzigingen:
+                # Only the edited rows are touched, looked up by id
+                save_data(wijzigingen=wijzigingen)
+                st.success(f"{len(wijzigingen)} meting(en) bijgewerkt en opgeslagen!")
+                st.rerun()
+            else:
+                st.info("Er zijn geen wijzigingen om op te slaan.")
+
+        if col_verwijderen.button("Geselecteerde metingen verwijderen"):
             if selected_rows_indices:
-                # Filter out the selected rows from the original DataFrame
-                df_to_delete_from = st.session_state['data']
-                updated_df = df_to_delete_from.drop(selected_rows_indices).reset_index(drop=True)
-                st.session_state['data'] = updated_df
-                save_data(updated_df)
+                # Drop the selected rows by 'meting_id'; other rows keep their id
+                save_data(verwijderde_ids=selected_rows_indices)
                 st.success(f"{len(selected_rows_indices)} meting(en) succesvol verwijderd en opgeslagen!")
-                st.rerun() # Rerun to refresh the displayed data and checkboxes
+                st.rerun() # Rerun to refresh the displayed data and selection
             else:
                 st.warning("Geen metingen geselecteerd om te verwijderen.")
     else:
         st.info("Er zijn nog geen metingen om te beheren.")
+
+with tab4:
+    st.header("Trends per locatie")
+
+    # Read from the rollups of the shared dataset (see rollups.py), which are
+    # kept up to date per write instead of grouping all rows on every rerun
+    trends = get_dataset().trends(df)
+    col_periode, col_waarde = st.columns(2)
+    periode = col_periode.radio("Periode", list(rollups.PERIODES), horizontal=True, key='trend_periode')
+    kolom = col_waarde.selectbox("Meetwaarde", rollups.ROLLUP_KOLOMMEN, key='trend_kolom')
+    trend_locaties = st.multiselect("Locatie", trends.locations(), key='trend_locaties')
+
+    samenvatting = trends.table(periode, kolom, trend_locaties)
+    if not samenvatting.empty:
+        st.line_chart(trends.trend(periode, kolom, locaties=trend_locaties))
+        st.dataframe(samenvatting, column_config={
+            'Gemiddeld': st.column_config.NumberColumn(format="%.2f"),
+            'Min': st.column_config.NumberColumn(format="%.2f"),
+            'Max': st.column_config.NumberColumn(format="%.2f"),
+        })
+    else:
+        st.info(f"Er zijn nog geen metingen met een waarde voor {kolom}.")
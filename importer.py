@@ -0,0 +1,80 @@
+import numpy as np
+import pandas as pd
+
+import datastore
+import preprocessing
+import stations
+
+# ---------- Metingen importeren ----------
+# Logger dumps (CSV or Excel) are checked in one vectorized pass with the same
+# rules as the form on the 'Nieuwe meting' tab. Accepted rows are committed as
+# one journal entry; rejected rows are reported with the reason.
+
+IMPORT_TYPES = ['csv', 'xlsx']
+
+NUMERIEKE_KOLOMMEN = preprocessing.MEASUREMENT_COLUMNS
+PH_BEREIK = (0, 20)
+HUMIDITY_BEREIK = (0, 100)
+
+
+def read_upload(bestand, naam):
+    if naam.lower().endswith('.csv'):
+        # Separator is sniffed: Excel in Dutch locale writes ';' with comma decimals
+        df = pd.read_csv(bestand, sep=None, engine='python')
+    else:
+        df = pd.read_excel(bestand)
+    return combine_coordinates(datastore.normalize_frame(df))
+
+
+def combine_coordinates(df):
+    # Loggers write latitude/longitude as separate columns
+    # (rows that do have 'Coordinaten' keep it)
+    kolommen = {col.lower(): col for col in df.columns}
+    if 'latitude' in kolommen and 'longitude' in kolommen:
+        lat = df[kolommen['latitude']]
+        lon = df[kolommen['longitude']]
+        samengevoegd = lat.astype(str).str.replace(',', '.') + ", " + lon.astype(str).str.replace(',', '.')
+        df['Coordinaten'] = df['Coordinaten'].where(df['Coordinaten'].notna(), samengevoegd.where(lat.notna() & lon.notna()))
+        df = df.drop(columns=[kolommen['latitude'], kolommen['longitude']])
+    return df
+
+
+def validate(df):
+    # Returns (geaccepteerd, afgekeurd); afgekeurd has a 'Reden' column.
+    # The rows are snapped to their station first (see stations.snap_rows).
+    df = stations.snap_frame(df).copy()
+    for col in NUMERIEKE_KOLOMMEN:
+        df[col] = preprocessing.to_number(df[col])
+    coords = preprocessing.parse_coordinates(df.copy())
+
+    locatie = df['Locatie'].astype(str).str.strip()
+    geen_locatie = df['Locatie'].isna() | (locatie == '') | (locatie.str.lower() == 'nan')
+    ph = df['PH']
+    humidity = df['Humidity']
+    reden = np.select(
+        [
+            geen_locatie,
+            df['Datum'].isna(),
+            ~coords['coord_ok'],
+            ph.notna() & ~ph.between(*PH_BEREIK),
+            humidity.notna() & ~humidity.between(*HUMIDITY_BEREIK),
+        ],
+        [
+            "Locatie ontbreekt",
+            "Datum ontbreekt of is ongeldig",
+            "Ongeldige of ontbrekende coördinaten",
+            "PH-waarde lijkt onrealistisch hoog/laag",
+            "Humidity moet tussen 0 en 100 liggen",
+        ],
+        default="",
+    )
+    ok = reden == ""
+    afgekeurd = df.loc[~ok].copy()
+    afgekeurd['Reden'] = reden[~ok]
+    return df.loc[ok], afgekeurd
+
+
+def to_rows(geaccepteerd):
+    # Records for datastore.append_rows; the ids are assigned there
+    rows = geaccepteerd.drop(columns=datastore.ID_COLUMN, errors='ignore')
+    return rows.to_dict('records')
@@ -0,0 +1,235 @@
+import argparse
+import asyncio
+import json
+import logging
+import os
+
+import pandas as pd
+
+import datastore
+import importer
+
+# ---------- Sensor ingestie ----------
+# Small HTTP service for automated probes, so readings no longer have to be
+# typed into the form. Readings are buffered and written as micro-batches: one
+# journal entry per batch instead of one write per reading. The dashboards pick
+# a batch up the next time they check the journal (see SharedDataset.refresh).
+#
+#   python ingest.py [--host 127.0.0.1] [--port 8765] [--data-file ...]
+#
+#   POST /metingen   one JSON object, a JSON list, or one object per line:
+#                    {"Locatie": "Sloterplas", "Coordinaten": "52.36, 4.80",
+#                     "PH": 7.4, "Temperatuur": 18.2, "Datum": "2025-05-21T10:00:00+02:00"}
+#                    'Datum' is optional (time of arrival); 'Latitude'/'Longitude'
+#                    may be sent instead of 'Coordinaten'.
+#   GET  /status     counters as JSON
+
+# A batch is written when it holds this many readings or is this old, whichever comes first
+BATCH_GROOTTE = int(os.environ.get("WATERKWALITEIT_INGEST_BATCH", 500))
+BATCH_SECONDEN = float(os.environ.get("WATERKWALITEIT_INGEST_SECONDEN", 1.0))
+
+# Readings waiting for a write; above this the service answers 503 so senders back off
+MAX_BUFFER = int(os.environ.get("WATERKWALITEIT_INGEST_MAX_BUFFER", 100_000))
+
+# Largest request body that is read; larger requests get 413 and the connection is closed
+MAX_BODY_BYTES = int(os.environ.get("WATERKWALITEIT_INGEST_MAX_BODY_MB", 16)) * 1024 * 1024
+
+# After a failed write the batch is retried after this many seconds, doubling
+# per failure up to the maximum
+FOUT_WACHTTIJD = 1.0
+FOUT_MAX_WACHTTIJD = 60.0
+
+# Timestamps with a UTC offset are stored as local time in this zone
+TIJDZONE = os.environ.get("WATERKWALITEIT_TIJDZONE", "Europe/Amsterdam")
+
+log = logging.getLogger("ingest")
+
+
+def _tijdstip(waarde):
+    if waarde in (None, ""):
+        return pd.Timestamp.now(tz=TIJDZONE).tz_localize(None)
+    try:
+        tijdstip = pd.Timestamp(waarde)
+    except (TypeError, ValueError, OverflowError):
+        # E.g. a list or an object instead of a time; reported to the sender as 400
+        raise ValueError(f"Ongeldige Datum: {waarde!r}")
+    if tijdstip.tzinfo is not None:
+        tijdstip = tijdstip.tz_convert(TIJDZONE).tz_localize(None)
+    return tijdstip
+
+
+class MicroBatcher:
+
+    def __init__(self, path=datastore.DATA_FILE, batch_grootte=BATCH_GROOTTE, batch_seconden=BATCH_SECONDEN):
+        self.path = path
+        self.batch_grootte = batch_grootte
+        self.batch_seconden = batch_seconden
+        self.buffer = []
+        self._vol = asyncio.Event()
+        self.ontvangen = 0
+        self.opgeslagen = 0
+        self.afgekeurd = 0
+        self.batches = 0
+        self.fouten = 0
+        self.laatste_fout = None
+        self._wachttijd = FOUT_WACHTTIJD
+
+    def add(self, metingen):
+        for meting in metingen:
+            meting['Datum'] = _tijdstip(meting.get('Datum'))
+            meting.setdefault('Meetdag', meting['Datum'].normalize())
+        self.buffer.extend(metingen)
+        self.ontvangen += len(metingen)
+        if len(self.buffer) >= self.batch_grootte:
+            self._vol.set()
+
+    def full(self):
+        return len(self.buffer) >= MAX_BUFFER
+
+    async def run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._vol.wait(), timeout=self.batch_seconden)
+            except asyncio.TimeoutError:
+                pass
+            self._vol.clear()
+            await self.flush()
+
+    async def flush(self):
+        while self.buffer:
+            batch = self.buffer[:self.batch_grootte]
+            del self.buffer[:self.batch_grootte]
+            # The write (and its fsync) runs in a thread, the loop keeps accepting readings
+            try:
+                await asyncio.to_thread(self._commit, batch)
+            except Exception as e:
+                # E.g. the data directory is gone: keep the batch and try again later
+                self.buffer[:0] = batch
+                self.fouten += 1
+                self.laatste_fout = f"{pd.Timestamp.now().isoformat(timespec='seconds')} {type(e).__name__}: {e}"
+                log.exception("Schrijven van %d meting(en) mislukt, opnieuw over %.0f s", len(batch), self._wachttijd)
+                await asyncio.sleep(self._wachttijd)
+                self._wachttijd = min(self._wachttijd * 2, FOUT_MAX_WACHTTIJD)
+                return
+            self._wachttijd = FOUT_WACHTTIJD
+
+    def _commit(self, batch):
+        df = importer.combine_coordinates(datastore.normalize_frame(pd.DataFrame(batch)))
+        geaccepteerd, afgekeurd = importer.validate(df)
+        if not geaccepteerd.empty:
+            datastore.backend(self.path).append_rows(importer.to_rows(geaccepteerd), self.path)
+        self.batches += 1
+        self.opgeslagen += len(geaccepteerd)
+        self.afgekeurd += len(afgekeurd)
+        for reden, aantal in afgekeurd['Reden'].value_counts().items():
+            log.warning("%d meting(en) afgekeurd: %s", aantal, reden)
+
+    def status(self):
+        return {
+            'ontvangen': self.ontvangen,
+            'opgeslagen': self.opgeslagen,
+            'afgekeurd': self.afgekeurd,
+            'batches': self.batches,
+            'in_buffer': len(self.buffer),
+            'fouten': self.fouten,
+            'laatste_fout': self.laatste_fout,
+        }
+
+
+# ---------- HTTP ----------
+def parse_body(body):
+    tekst = body.decode("utf-8").strip()
+    if not tekst:
+        return []
+    try:
+        data = json.loads(tekst)
+    except json.JSONDecodeError:
+        # Newline-delimited JSON, one reading per line
+        data = [json.loads(regel) for regel in tekst.splitlines() if regel.strip()]
+    metingen = data if isinstance(data, list) else [data]
+    if not all(isinstance(meting, dict) for meting in metingen):
+        raise ValueError("Verwacht een JSON-object of een lijst van objecten")
+    return metingen
+
+
+async def _respond(writer, status, data):
+    body = json.dumps(data).encode("utf-8")
+    writer.write(
+        f"HTTP/1.1 {status}\r\n"
+        f"Content-Type: application/json\r\n"
+        f"Content-Length: {len(body)}\r\n\r\n".encode("ascii") + body
+    )
+    await writer.drain()
+
+
+async def handle(batcher, reader, writer):
+    # Keep-alive: a probe can send many requests over one connection
+    try:
+        while True:
+            regel = await reader.readline()
+            if not regel:
+                break
+            methode, pad, _ = regel.decode("latin-1").split(" ", 2)
+            headers = {}
+            while (header := await reader.readline()) not in (b"\r\n", b"\n", b""):
+                naam, _, waarde = header.decode("latin-1").partition(":")
+                headers[naam.strip().lower()] = waarde.strip()
+            lengte = int(headers.get("content-length", 0))
+            if not 0 <= lengte <= MAX_BODY_BYTES:
+                await _respond(writer, "413 Content Too Large", {'fout': f"Maximaal {MAX_BODY_BYTES} bytes per verzoek"})
+                break  # the body is not read, so the connection cannot be reused
+            body = await reader.readexactly(lengte)
+
+            if methode == "POST" and pad == "/metingen":
+                if batcher.full():
+                    await _respond(writer, "503 Service Unavailable", {'fout': "Buffer vol, probeer later opnieuw"})
+                    continue
+                try:
+                    metingen = parse_body(body)
+                    batcher.add(metingen)
+                except ValueError as e:
+                    await _respond(writer, "400 Bad Request", {'fout': str(e)})
+                    continue
+                await _respond(writer, "202 Accepted", {'ontvangen': len(metingen)})
+            elif methode == "GET" and pad == "/status":
+                await _respond(writer, "200 OK", batcher.status())
+            else:
+                await _respond(writer, "404 Not Found", {'fout': f"Onbekend pad {pad}"})
+
+            if headers.get("connection", "").lower() == "close":
+                break
+    except (ValueError, asyncio.IncompleteReadError, ConnectionError):
+        pass
+    finally:
+        writer.close()
+
+
+async def serve(host, port, path=datastore.DATA_FILE):
+    batcher = MicroBatcher(path)
+    server = await asyncio.start_server(lambda r, w: handle(batcher, r, w), host, port)
+    log.info("Ingestie op http://%s:%d/metingen, data in %s", host, port, path)
+    schrijver = asyncio.create_task(batcher.run())
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        schrijver.cancel()
+        # Whatever is still buffered is written before the service stops
+        await batcher.flush()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Ingestie van sensormetingen")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--data-file", default=datastore.DATA_FILE, help="Pad naar de Parquet store of SQLite database")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    try:
+        asyncio.run(serve(args.host, args.port, args.data_file))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+import math
+
+import numpy as np
+import pandas as pd
+
+import dateindex
+import preprocessing
+import stations
+
+# ---------- Metingen beheren ----------
+# Filtering and paging for the management tab. Only one page of the filtered
+# measurements is turned into widgets, so the tab renders in the same time
+# whether the dataset holds a hundred or a million rows.
+
+PAGINA_GROOTTES = [25, 50, 100, 250]
+BEHEER_KOLOMMEN = ['Locatie', 'Datum', 'Coordinaten', 'PH', 'Temperatuur']
+
+
+def filter_rows(df, index, start=None, end=None, sleutels=None):
+    # Date range through the date index, then the (much smaller) slice on
+    # station; sleutels are station keys (see stations.station_keys)
+    if start is not None and end is not None:
+        df = dateindex.range_rows(df, index, start, end)
+    if sleutels:
+        df = df[df[stations.STATION_KEY].isin(sleutels)]
+    return df
+
+
+def page_count(n_rows, page_size):
+    return max(1, math.ceil(n_rows / page_size))
+
+
+def page(df, number, page_size):
+    # number starts at 1, like the page selector in the tab
+    start = (number - 1) * page_size
+    return df.iloc[start:start + page_size]
+
+
+def _float64(values):
+    # float32 -> float64 through the shortest repr, so 7.1 stays 7.1 instead of
+    # becoming 7.099999904632568 in the journal and the store
+    return values.map(lambda v: float(np.format_float_positional(np.float32(v))), na_action='ignore').astype('float64')
+
+
+def _editor_types(df):
+    # Plain text instead of categories, otherwise the editor only offers the
+    # existing values; the measurements in the store's float64
+    for col in df.columns:
+        if isinstance(df[col].dtype, pd.CategoricalDtype):
+            df[col] = df[col].astype(object)
+        elif col in preprocessing.MEASUREMENT_COLUMNS and df[col].dtype == 'float32':
+            df[col] = _float64(df[col])
+    return df
+
+
+def editor_frame(df, select_all=False):
+    # The columns the old per-row view showed, plus a selection column
+    weergave = _editor_types(df[BEHEER_KOLOMMEN].copy())
+    weergave.insert(0, 'Verwijderen', select_all)
+    return weergave
+
+
+def changed_cells(origineel, bewerkt, kolommen=BEHEER_KOLOMMEN):
+    # {meting_id: {kolom: nieuwe waarde}} for the cells edited in the data_editor
+    origineel = _editor_types(origineel[kolommen].copy())
+    wijzigingen = {}
+    for col in kolommen:
+        oud = origineel[col]
+        nieuw = bewerkt[col].reindex(oud.index)
+        if col in preprocessing.MEASUREMENT_COLUMNS and nieuw.dtype == 'float32':
+            nieuw = _float64(nieuw)
+        gelijk = (oud == nieuw) | (oud.isna() & nieuw.isna())
+        for meting_id, waarde in nieuw[~gelijk].items():
+            wijzigingen.setdefault(meting_id, {})[col] = waarde
+    return wijzigingen
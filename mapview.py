@@ -0,0 +1,522 @@
+import json
+import os
+from collections import OrderedDict
+from typing import NamedTuple
+
+import branca
+import folium
+import numpy as np
+import pandas as pd
+import pydeck as pdk
+from folium.elements import JSCSSMixin, MacroElement
+from folium.plugins import FastMarkerCluster
+from folium.template import Template
+from pydeck.bindings import json_tools
+
+import spatialindex
+
+# ---------- Kaart opbouwen ----------
+# Shared map code for the dashboards. The points of a day are sent to the
+# browser as one compact [lat, lon, kleur, popup] array; above CLUSTER_DREMPEL
+# points they are clustered client-side.
+
+CLUSTER_DREMPEL = int(os.environ.get("WATERKWALITEIT_CLUSTER_DREMPEL", 500))
+
+# Number of built maps kept per session, see MapCache
+KAART_CACHE_GROOTTE = int(os.environ.get("WATERKWALITEIT_KAART_CACHE", 32))
+
+KAART_CENTRUM = [52.36, 4.9]
+KAART_ZOOM = 13
+
+# Time line: default and maximum number of days in one map, see build_time_map
+TIJDLIJN_DAGEN = 14
+TIJDLIJN_MAX_DAGEN = int(os.environ.get("WATERKWALITEIT_TIJDLIJN_MAX_DAGEN", 92))
+
+# Fill colours of the time line points, the same as the AwesomeMarkers colours
+KLEUR_HEX = {'green': '#72b026', 'orange': '#f69730', 'red': '#d63e2a', 'gray': '#a3a3a3'}
+
+# Builds the same AwesomeMarkers icon as folium.Icon(color=...) for each data row
+_MARKER_CALLBACK = """
+function (row) {
+    var marker = L.marker(new L.LatLng(row[0], row[1]), {
+        icon: L.AwesomeMarkers.icon({markerColor: row[2], icon: 'info-sign', prefix: 'glyphicon'})
+    });
+    marker.options.kleur = row[2];
+    marker.bindPopup(row[3], {maxWidth: 300});
+    return marker;
+}
+"""
+
+# Same marker without popup: row[3] is only an id, the details are looked up in
+# Python when st_folium reports the click (see build_click_map)
+_CLICK_CALLBACK = """
+function (row) {
+    var marker = L.marker(new L.LatLng(row[0], row[1]), {
+        icon: L.AwesomeMarkers.icon({markerColor: row[2], icon: 'info-sign', prefix: 'glyphicon'})
+    });
+    marker.options.kleur = row[2];
+    marker.options.meting_id = row[3];
+    return marker;
+}
+"""
+
+# A cluster takes the colour of its worst child: red > orange > green, gray only
+# when none of the measurements in the cluster has a pH value
+_CLUSTER_ICON = """
+function (cluster) {
+    var ernst = {gray: 0, green: 1, orange: 2, red: 3};
+    var kleur = 'gray';
+    var markers = cluster.getAllChildMarkers();
+    for (var i = 0; i < markers.length; i++) {
+        var k = markers[i].options.kleur;
+        if (ernst[k] > ernst[kleur]) { kleur = k; }
+    }
+    return L.divIcon({
+        html: '<div><span>' + cluster.getChildCount() + '</span></div>',
+        className: 'marker-cluster ph-cluster-' + kleur,
+        iconSize: new L.Point(40, 40)
+    });
+}
+"""
+
+# Added to the page header as an element of the map, so it survives fresh_root()
+_CLUSTER_STYLE = Template("""
+{% macro header(this, kwargs) %}
+<style>
+.ph-cluster-green { background-color: rgba(114, 176, 38, 0.4); }
+.ph-cluster-green div { background-color: rgba(114, 176, 38, 0.8); }
+.ph-cluster-orange { background-color: rgba(246, 151, 48, 0.4); }
+.ph-cluster-orange div { background-color: rgba(246, 151, 48, 0.8); }
+.ph-cluster-red { background-color: rgba(214, 62, 42, 0.4); }
+.ph-cluster-red div { background-color: rgba(214, 62, 42, 0.8); }
+.ph-cluster-gray { background-color: rgba(87, 87, 87, 0.4); }
+.ph-cluster-gray div { background-color: rgba(163, 163, 163, 0.8); color: white; }
+</style>
+{% endmacro %}
+""")
+
+
+class MarkerLayer(MacroElement):
+    # All markers of a day in one element. Unlike folium.Marker (which adds a
+    # new setIcon call every time it is rendered) this renders the same script
+    # every time, so a built map can be cached and shown again.
+    _template = Template(
+        """
+        {% macro script(this, kwargs) %}
+            var {{ this.get_name() }} = (function(){
+                var callback = {{ this.callback }};
+                var data = {{ this.data|tojson }};
+                var layer = L.featureGroup();
+                for (var i = 0; i < data.length; i++) {
+                    callback(data[i]).addTo(layer);
+                }
+                layer.addTo({{ this._parent.get_name() }});
+                return layer;
+            })();
+        {% endmacro %}"""
+    )
+
+    def __init__(self, data, callback):
+        super().__init__()
+        self._name = "MarkerLayer"
+        self.data = data
+        self.callback = callback
+
+
+def popup_column(punten, waardes):
+    # "<b>Locatie</b><br>PH: 7.2<br>..." for all points at once
+    popups = "<b>" + punten['Locatie'].astype(str) + "</b><br>"
+    for col in waardes:
+        if col in punten.columns:
+            values = punten[col]
+            popups = popups + (f"{col}: " + values.astype(str) + "<br>").where(values.notna(), "")
+    return popups
+
+
+def marker_data(punten, waardes):
+    # One [lat, lon, kleur, popup] array for all points instead of Marker objects
+    return list(zip(
+        punten['lat'].tolist(),
+        punten['lon'].tolist(),
+        punten['kleur'].astype(str).tolist(),
+        popup_column(punten, waardes).tolist(),
+    ))
+
+
+def add_markers(kaart, data, callback):
+    MarkerLayer(data, callback=callback).add_to(kaart)
+
+
+def add_cluster(kaart, data, callback):
+    stijl = MacroElement()
+    stijl._template = _CLUSTER_STYLE
+    kaart.add_child(stijl)
+    FastMarkerCluster(
+        data,
+        callback=callback,
+        icon_create_function=_CLUSTER_ICON,
+    ).add_to(kaart)
+
+
+def _add_points(kaart, data, callback, cluster_drempel):
+    if len(data) > cluster_drempel:
+        add_cluster(kaart, data, callback)
+    else:
+        add_markers(kaart, data, callback)
+
+
+def build_map(filtered_df, waardes, cluster_drempel=CLUSTER_DREMPEL):
+    kaart = folium.Map(location=KAART_CENTRUM, zoom_start=KAART_ZOOM)
+
+    # Rows without valid coordinates are listed under 'Afgekeurde rijen' instead
+    punten = filtered_df[filtered_df['coord_ok']]
+    _add_points(kaart, marker_data(punten, waardes), _MARKER_CALLBACK, cluster_drempel)
+    return kaart
+
+
+# ---------- Alleen het zichtbare gebied ----------
+# The map itself stays the same (and is not reloaded); only a feature group with
+# the points in view is swapped, through st_folium's feature_group_to_add.
+# st_folium reports 'bounds' and 'zoom' after every pan or zoom.
+# Layers kept per viewport index, so a rerun without pan or zoom (e.g. after a
+# click) sends the same layer again instead of building it anew
+VIEWPORT_LAGEN = 8
+
+
+class ViewportIndex(NamedTuple):
+    punten: pd.DataFrame          # the day's points with valid coordinates, marker id i is row i
+    index: spatialindex.GridIndex
+    posities: dict                # (lat, lon) -> marker ids at that spot
+    lagen: OrderedDict            # (point positions, waardes, details_bij_klik) -> layer
+
+
+def build_viewport_index(filtered_df):
+    punten = filtered_df[filtered_df['coord_ok']].reset_index(drop=True)
+    posities = _click_positions(punten['lat'].tolist(), punten['lon'].tolist())
+    return ViewportIndex(punten, spatialindex.build_grid_index(punten), posities, OrderedDict())
+
+
+class _ClusterAssets(JSCSSMixin, MacroElement):
+    # The marker cluster scripts and colours in the page header. A feature
+    # group passed to st_folium only brings its own script, so the base map
+    # has to carry them for a clustered viewport layer.
+    _template = _CLUSTER_STYLE
+    default_js = FastMarkerCluster.default_js
+    default_css = FastMarkerCluster.default_css
+
+
+def build_base_map():
+    kaart = folium.Map(location=KAART_CENTRUM, zoom_start=KAART_ZOOM)
+    kaart.add_child(_ClusterAssets())
+    return kaart
+
+
+def folium_viewport(kaart_data):
+    # (zuid, west, noord, oost, zoom) from st_folium's return value, None before the first report
+    bounds = (kaart_data or {}).get('bounds') or {}
+    zuidwest = bounds.get('_southWest') or {}
+    noordoost = bounds.get('_northEast') or {}
+    if zuidwest.get('lat') is None or noordoost.get('lat') is None:
+        return None
+    return (zuidwest['lat'], zuidwest['lng'], noordoost['lat'], noordoost['lng'], kaart_data.get('zoom') or KAART_ZOOM)
+
+
+def viewport_positions(viewport_index, viewport):
+    if viewport is None:
+        # Not reported yet: the whole day, thinned for the starting zoom
+        viewport = spatialindex.extent(viewport_index.index) + (KAART_ZOOM,)
+        return spatialindex.viewport_positions(viewport_index.index, *viewport, marge=0)
+    return spatialindex.viewport_positions(viewport_index.index, *viewport)
+
+
+def viewport_layer(viewport_index, posities, waardes, details_bij_klik, cluster_drempel=CLUSTER_DREMPEL):
+    # The points in view as in build_map, or as in build_click_map (markers
+    # with only their id) when the details are shown on click
+    key = (posities.tobytes(), tuple(waardes), details_bij_klik)
+    groep = viewport_index.lagen.get(key)
+    if groep is not None:
+        viewport_index.lagen.move_to_end(key)
+        return groep
+    punten = viewport_index.punten.iloc[posities]
+    if details_bij_klik:
+        data = list(zip(punten['lat'].tolist(), punten['lon'].tolist(), punten['kleur'].astype(str).tolist(),
+                        np.asarray(posities).tolist()))
+        callback = _CLICK_CALLBACK
+    else:
+        data = marker_data(punten, waardes)
+        callback = _MARKER_CALLBACK
+    groep = folium.FeatureGroup(name="Meetpunten")
+    _add_points(groep, data, callback, cluster_drempel)
+    viewport_index.lagen[key] = groep
+    while len(viewport_index.lagen) > VIEWPORT_LAGEN:
+        viewport_index.lagen.popitem(last=False)
+    return groep
+
+
+def viewport_clicked(viewport_index, klik):
+    return _measurements_at(viewport_index.punten, viewport_index.posities, klik)
+
+
+# ---------- Tijdlijn ----------
+class TimeLayer(JSCSSMixin, MacroElement):
+    # All days of a window in one element, driven by a Leaflet.TimeDimension
+    # slider: scrubbing or playing only swaps the layer of the shown day in the
+    # browser, without a rerun. The points are serialized to JSON once, when
+    # the map is built, so showing a cached map again does not redo it.
+    _template = Template(
+        """
+        {% macro script(this, kwargs) %}
+            var {{ this.get_name() }} = (function(){
+                var kaart = {{ this._parent.get_name() }};
+                var dagen = {{ this.dagen }};
+                var punten = {{ this.punten }};
+                var kleuren = {{ this.kleuren }};
+                var tijden = dagen.map(function (dag) { return Date.parse(dag); });
+                var renderer = L.canvas();
+                var lagen = {};
+                var huidig = null;
+
+                // The markers of a day are only created the first time it is shown
+                function laag(i) {
+                    if (!lagen[i]) {
+                        lagen[i] = L.featureGroup(punten[i].map(function (row) {
+                            return L.circleMarker([row[0], row[1]], {
+                                renderer: renderer, radius: 8, weight: 1, color: 'white',
+                                fillColor: kleuren[row[2]], fillOpacity: 0.9
+                            }).bindPopup(row[3], {maxWidth: 300});
+                        }));
+                    }
+                    return lagen[i];
+                }
+
+                if (!tijden.length) { return null; }
+                var timeDimension = L.timeDimension({times: tijden, currentTime: tijden[0]});
+                var Control = L.Control.TimeDimension.extend({
+                    _getDisplayDateFormat: function (date) { return date.toISOString().substring(0, 10); }
+                });
+                kaart.addControl(new Control({
+                    timeDimension: timeDimension,
+                    position: 'bottomleft',
+                    autoPlay: false,
+                    loopButton: true,
+                    timeSliderDragUpdate: true,
+                    playerOptions: {transitionTime: {{ this.transition_time }}, loop: true, startOver: true}
+                }));
+                timeDimension.on('timeload', function (e) {
+                    if (huidig) { kaart.removeLayer(huidig); }
+                    var i = tijden.indexOf(e.time);
+                    huidig = i < 0 ? null : laag(i).addTo(kaart);
+                });
+                timeDimension.setCurrentTime(tijden[0]);
+                return timeDimension;
+            })();
+        {% endmacro %}"""
+    )
+
+    default_js = [
+        ("iso8601", "https://cdn.jsdelivr.net/npm/iso8601-js-period@0.2.1/iso8601.min.js"),
+        ("leaflet.timedimension", "https://cdn.jsdelivr.net/npm/leaflet-timedimension@1.1.1/dist/leaflet.timedimension.min.js"),
+    ]
+    default_css = [
+        ("leaflet.timedimension_css", "https://cdn.jsdelivr.net/npm/leaflet-timedimension@1.1.1/dist/leaflet.timedimension.control.css"),
+    ]
+
+    def __init__(self, dagen, punten, transition_time=1000):
+        super().__init__()
+        self._name = "TimeLayer"
+        self.dagen = _script_json(dagen)
+        self.punten = _script_json(punten)
+        self.kleuren = _script_json(KLEUR_HEX)
+        self.transition_time = int(transition_time)
+
+
+def _script_json(value):
+    # Compact JSON that is safe inside a <script> tag (popups contain HTML)
+    return json.dumps(value, separators=(',', ':')).replace('<', '\\u003c')
+
+
+def build_time_map(window_df, waardes):
+    # One map for all days in window_df: per day a list of [lat, lon, kleur, popup]
+    kaart = folium.Map(location=KAART_CENTRUM, zoom_start=KAART_ZOOM)
+
+    punten = window_df[window_df['coord_ok']]
+    punten = punten.assign(lat=punten['lat'].round(6), lon=punten['lon'].round(6))
+    per_dag = {}
+    for dag, row in zip(punten['Datum'].dt.strftime('%Y-%m-%d').tolist(), marker_data(punten, waardes)):
+        per_dag.setdefault(dag, []).append(row)
+    dagen = sorted(per_dag)
+    TimeLayer(dagen, [per_dag[dag] for dag in dagen]).add_to(kaart)
+    return kaart
+
+
+# ---------- WebGL (pydeck) ----------
+# deck.gl draws all points of a day on the GPU instead of one DOM element per
+# marker. Each pH colour is one ScatterplotLayer whose data is only the
+# [lon, lat] pairs; the colour is a constant of the layer. No basemap is
+# requested (map_provider=None), so no Mapbox token or internet is needed.
+
+# Drawn in this order, so the unsafe points end up on top
+DECK_LAGEN = ['gray', 'green', 'orange', 'red']
+
+
+class CompactDeck(pdk.Deck):
+    # pydeck pretty-prints its JSON with one number per line; for 100k points
+    # that is most of what goes to the browser. Serialized once, a cached deck
+    # is sent again as is.
+    def to_json(self):
+        if '_json' not in vars(self):
+            json_string = json.dumps(self, sort_keys=True, default=json_tools.default_serialize, separators=(',', ':'))
+            self._json = json_string
+        return self._json
+
+
+class DeckMap(NamedTuple):
+    deck: pdk.Deck
+    metingen: dict   # layer id (kleur) -> the points of that layer, point i is row i
+
+
+def _rgb(kleur):
+    return [int(KLEUR_HEX[kleur][i:i + 2], 16) for i in (1, 3, 5)]
+
+
+def build_deck_map(filtered_df):
+    punten = filtered_df[filtered_df['coord_ok']]
+    lagen = []
+    metingen = {}
+    for kleur in DECK_LAGEN:
+        groep = punten[punten['kleur'] == kleur].reset_index(drop=True)
+        if groep.empty:
+            continue
+        posities = np.column_stack([groep['lon'].to_numpy(), groep['lat'].to_numpy()]).round(6).tolist()
+        lagen.append(pdk.Layer(
+            "ScatterplotLayer",
+            id=kleur,
+            data=posities,
+            get_position='-',  # the datum itself is the [lon, lat] pair
+            get_fill_color=_rgb(kleur),
+            get_line_color=[255, 255, 255],
+            get_radius=15,
+            radius_min_pixels=4,
+            radius_max_pixels=12,
+            stroked=True,
+            line_width_min_pixels=1,
+            pickable=True,
+        ))
+        metingen[kleur] = groep
+    deck = CompactDeck(
+        layers=lagen,
+        initial_view_state=pdk.ViewState(latitude=KAART_CENTRUM[0], longitude=KAART_CENTRUM[1], zoom=KAART_ZOOM - 1),
+        map_provider=None,
+        map_style=None,
+    )
+    return DeckMap(deck, metingen)
+
+
+def selected_measurements(deck_map, selectie):
+    # selectie is the 'selection' of st.pydeck_chart: {'indices': {layer id: [i, ...]}, ...}
+    rijen = [
+        deck_map.metingen[laag].iloc[[i for i in indices if i < len(deck_map.metingen[laag])]]
+        for laag, indices in (selectie or {}).get('indices', {}).items()
+        if laag in deck_map.metingen
+    ]
+    return pd.concat(rijen) if rijen else pd.DataFrame()
+
+
+# ---------- Details pas bij klikken ----------
+class ClickMap(NamedTuple):
+    kaart: folium.Map
+    metingen: pd.DataFrame   # the day's points, marker id i is row i
+    posities: dict           # (lat, lon) -> marker ids at that spot
+
+
+def _positie(lat, lon):
+    return (round(lat, 7), round(lon, 7))
+
+
+def build_click_map(filtered_df, cluster_drempel=CLUSTER_DREMPEL):
+    # Markers only carry an id, so no popup text is built or sent for the
+    # (many) markers nobody opens; the selected 'waardes' do not affect the map
+    kaart = folium.Map(location=KAART_CENTRUM, zoom_start=KAART_ZOOM)
+
+    punten = filtered_df[filtered_df['coord_ok']].reset_index(drop=True)
+    lat = punten['lat'].tolist()
+    lon = punten['lon'].tolist()
+    data = list(zip(lat, lon, punten['kleur'].astype(str).tolist(), range(len(punten))))
+    _add_points(kaart, data, _CLICK_CALLBACK, cluster_drempel)
+    return ClickMap(kaart, punten, _click_positions(lat, lon))
+
+
+def _click_positions(lat, lon):
+    posities = {}
+    for meting_id, positie in enumerate(zip(lat, lon)):
+        posities.setdefault(_positie(*positie), []).append(meting_id)
+    return posities
+
+
+def _measurements_at(metingen, posities, klik):
+    # klik is st_folium's 'last_object_clicked': {'lat': ..., 'lng': ...}
+    if not klik:
+        return metingen.iloc[[]]
+    return metingen.iloc[posities.get(_positie(klik['lat'], klik['lng']), [])]
+
+
+def clicked_measurements(click_map, klik):
+    return _measurements_at(click_map.metingen, click_map.posities, klik)
+
+
+def fresh_root(kaart):
+    # Rendering appends to the Figure that holds the map, so a cached map gets
+    # a new, empty Figure before it is passed to st_folium again
+    branca.element.Figure().add_child(kaart)
+    return kaart
+
+
+# ---------- Cache van opgebouwde kaarten ----------
+class MapCache:
+    # Bounded LRU of built maps keyed on (first day, last day, options, version
+    # of those days), where the options are the selected 'waardes' or the map
+    # mode; a map of one day has the same first and last day. A write only bumps
+    # the version of the days it touches, so maps without those days stay valid.
+
+    def __init__(self, maxsize=KAART_CACHE_GROOTTE):
+        self.maxsize = maxsize
+        self._kaarten = OrderedDict()
+        self._versies = {}
+        self.hits = 0
+        self.misses = 0
+
+    def _key(self, van, tot, opties):
+        van = pd.Timestamp(van).date()
+        tot = pd.Timestamp(tot).date()
+        versie = tuple(sorted((dag, v) for dag, v in self._versies.items() if van <= dag <= tot))
+        return (van, tot, opties, versie)
+
+    def get_or_build(self, dag, opties, build):
+        return self.get_or_build_range(dag, dag, opties, build)
+
+    def get_or_build_range(self, van, tot, opties, build):
+        key = self._key(van, tot, opties)
+        kaart = self._kaarten.get(key)
+        if kaart is not None:
+            self.hits += 1
+            self._kaarten.move_to_end(key)
+            return kaart
+        self.misses += 1
+        kaart = build()
+        self._kaarten[key] = kaart
+        while len(self._kaarten) > self.maxsize:
+            self._kaarten.popitem(last=False)
+        return kaart
+
+    def invalidate(self, dagen):
+        for dag in {pd.Timestamp(d).date() for d in dagen if pd.notna(d)}:
+            self._versies[dag] = self._versies.get(dag, 0) + 1
+            for key in [k for k in self._kaarten if k[0] <= dag <= k[1]]:
+                del self._kaarten[key]
+
+    def __len__(self):
+        return len(self._kaarten)
+
+    def clear(self):
+        self._kaarten.clear()
+        self._versies.clear()
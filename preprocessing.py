@@ -0,0 +1,133 @@
+import numpy as np
+import pandas as pd
+
+import datastore
+
+# ---------- Voorbewerking van de meetdata ----------
+# Everything that used to be recomputed per row inside the map loop is derived
+# here once, vectorized, when a dataset version is loaded. The derived columns
+# are never written back to the store.
+
+DERIVED_COLUMNS = ['lat', 'lon', 'coord_ok', 'kleur', 'status']
+
+# In-memory types of the store columns, enforced when a frame is prepared.
+# float32 holds the 3-4 significant digits of the probes with room to spare and
+# halves the size of the measurement columns; the location names repeat on
+# every row and are stored once as categories. The store and the exports keep
+# their own (float64) types.
+MEASUREMENT_COLUMNS = ['PH', 'Temperatuur', 'ORP', 'EC', 'CF', 'TDS', 'Humidity', 'Buitentemperatuur']
+CATEGORY_COLUMNS = ['Locatie']
+
+# Marker colour per pH class, from safe to unsafe; gray when there is no pH
+KLEUREN = ['green', 'orange', 'red', 'gray']
+STATUS = {
+    'green': "Veilig",
+    'orange': "Verhoogd risico",
+    'red': "Onveilig",
+    'gray': "Onbekend",
+}
+
+
+def parse_coordinates(df):
+    # "52.3597533, 4.9070122" -> lat/lon float64 columns plus a validity flag.
+    # Each distinct string is parsed once; fixed probes repeat their coordinates.
+    codes, uniek = pd.factorize(df['Coordinaten'])
+    coords = pd.Series(uniek, dtype=object).astype(str).str.strip()
+    parts = coords.str.extract(r'^([^,]+),\s*([^,]+)$')
+    lat = pd.to_numeric(parts[0].str.strip(), errors='coerce').to_numpy(dtype='float64')
+    lon = pd.to_numeric(parts[1].str.strip(), errors='coerce').to_numpy(dtype='float64')
+
+    in_range = (lat >= -90) & (lat <= 90) & (lon >= -180) & (lon <= 180)
+    # Code -1 (missing) picks the NaN appended at the end
+    lat = np.append(np.where(in_range, lat, np.nan), np.nan)[codes]
+    lon = np.append(np.where(in_range, lon, np.nan), np.nan)[codes]
+    df['lat'] = lat
+    df['lon'] = lon
+    df['coord_ok'] = ~np.isnan(lat)
+    return df
+
+
+def to_number(values):
+    # Handles comma decimals such as "7,2" that come in through Excel
+    if pd.api.types.is_numeric_dtype(values):
+        return values.astype('float64')
+    return pd.to_numeric(values.astype(str).str.replace(',', '.'), errors='coerce')
+
+
+def apply_schema(df):
+    for col in MEASUREMENT_COLUMNS:
+        if col in df.columns:
+            df[col] = to_number(df[col]).astype('float32')
+    for col in datastore.DATE_COLUMNS:
+        if col in df.columns and not pd.api.types.is_datetime64_any_dtype(df[col]):
+            df[col] = pd.to_datetime(df[col], errors='coerce')
+    for col in CATEGORY_COLUMNS:
+        if col in df.columns and not isinstance(df[col].dtype, pd.CategoricalDtype):
+            df[col] = df[col].astype('category')
+    if datastore.STATION_COLUMN in df.columns:
+        df[datastore.STATION_COLUMN] = pd.to_numeric(df[datastore.STATION_COLUMN], errors='coerce').astype('Int32')
+    return df
+
+
+def concat_frames(df, nieuw):
+    # Appends prepared rows; categories the new rows bring are added at the end,
+    # so the codes of the existing rows stay valid and the dtype stays categorical
+    df = df.copy(deep=False)
+    for col in CATEGORY_COLUMNS:
+        categorieen = df[col].cat.categories
+        categorieen = categorieen.append(nieuw[col].cat.categories.difference(categorieen))
+        df[col] = df[col].cat.set_categories(categorieen)
+        nieuw[col] = nieuw[col].cat.set_categories(categorieen)
+    return pd.concat([df, nieuw])
+
+
+def memory_report(df):
+    # Bytes per column (deep, so strings are counted), largest first
+    bytes_ = df.memory_usage(index=True, deep=True)
+    report = pd.DataFrame({
+        'dtype': [str(df.index.dtype) if col == 'Index' else str(df[col].dtype) for col in bytes_.index],
+        'MB': bytes_.to_numpy() / 1024 ** 2,
+    }, index=bytes_.index)
+    return report.sort_values('MB', ascending=False)
+
+
+def classify_ph(df):
+    # 6.5-8.5 green, 5.5-6.5 or 8.5-9.5 orange, anything else red
+    ph = to_number(df['PH'])
+    kleur = np.select(
+        [ph.isna(), ph.between(6.5, 8.5), ph.between(5.5, 9.5)],
+        ['gray', 'green', 'orange'],
+        default='red',
+    )
+    df['kleur'] = pd.Categorical(kleur, categories=KLEUREN)
+    df['status'] = df['kleur'].map(STATUS)
+    return df
+
+
+def rejected_rows(df):
+    # Report of the rows that cannot be shown on the map, with the reason why
+    rejected = df.loc[~df['coord_ok']].copy()
+    missing = rejected['Coordinaten'].isna() | (rejected['Coordinaten'].astype(str).str.strip() == '')
+    parsed = rejected['Coordinaten'].astype(str).str.match(r'^\s*[-+.\d]+\s*,\s*[-+.\d]+\s*$')
+    rejected['Reden'] = np.select(
+        [missing, parsed],
+        ["Coördinaten ontbreken", "Coördinaten buiten bereik"],
+        default="Ongeldig formaat voor coördinaten",
+    )
+    return rejected.drop(columns=DERIVED_COLUMNS)
+
+
+def refresh_rows(df, ids):
+    # Re-derive the columns of edited rows only, instead of the whole frame
+    bron = df.loc[ids, [col for col in df.columns if col not in DERIVED_COLUMNS]].copy()
+    rows = prepare_frame(bron)
+    for col in DERIVED_COLUMNS:
+        df[col] = df[col].copy()
+        df.loc[ids, col] = rows[col]
+    return df
+
+
+def prepare_frame(df):
+    df = apply_schema(df)
+    df = parse_coordinates(df)
+    return classify_ph(df)
@@ -0,0 +1,99 @@
+import pandas as pd
+
+import dateindex
+import stations
+
+# ---------- Trends per locatie ----------
+# Mean/min/max per station and period are kept as materialized aggregates
+# (count, sum, min and max per station key and bucket, see
+# stations.station_keys) next to the shared dataset,
+# instead of a groupby over all rows on every rerun. A write only touches the
+# buckets of the days it changed: inserted rows are added to the counts, sums
+# and extremes, the buckets of deleted or edited rows are recomputed from the
+# rows of that bucket alone (a minimum cannot be subtracted again).
+
+# Buckets start on the day, the Monday of the week and the first of the month
+PERIODES = {'Dag': 'D', 'Week': 'W', 'Maand': 'M'}
+ROLLUP_KOLOMMEN = ['PH', 'Temperatuur', 'EC']
+STATS = ['count', 'sum', 'min', 'max']
+
+
+def bucket(datum, periode):
+    return datum.dt.to_period(PERIODES[periode]).dt.start_time
+
+
+def aggregate(df, periode):
+    # One row per (station, Periode), columns (kolom, stat)
+    groepen = [df[stations.STATION_KEY], bucket(df['Datum'], periode).rename('Periode')]
+    return df.reindex(columns=ROLLUP_KOLOMMEN).astype('float64').groupby(groepen).agg(STATS)
+
+
+def _combine(tabel, extra):
+    samen = pd.concat([tabel, extra]).groupby(level=[stations.STATION_KEY, 'Periode'])
+    return samen.agg({col: 'min' if col[1] == 'min' else 'max' if col[1] == 'max' else 'sum' for col in tabel.columns})
+
+
+def _recompute(tabel, data, index, dagen, periode):
+    starts = bucket(pd.to_datetime(pd.Series(list(dagen))).dropna(), periode).unique()
+    tabel = tabel[~tabel.index.get_level_values('Periode').isin(starts)]
+    frames = []
+    for start in starts:
+        eind = pd.Period(start, PERIODES[periode]).end_time
+        frames.append(dateindex.range_rows(data, index, start, eind))
+    if not frames:
+        return tabel
+    return pd.concat([tabel, aggregate(pd.concat(frames), periode)]).sort_index()
+
+
+class Rollups:
+    # Immutable: an update returns new tables, so sessions that still look at
+    # an older snapshot keep consistent trends
+
+    def __init__(self, tabellen, namen):
+        self.tabellen = tabellen
+        self.namen = namen  # label per station key
+
+    def updated(self, data, index, nieuw=None, dagen=()):
+        # nieuw: inserted rows; dagen: days of deleted or edited rows, whose
+        # buckets are recomputed from 'data' (which already holds the inserts)
+        tabellen = {}
+        for periode, tabel in self.tabellen.items():
+            if nieuw is not None and len(nieuw):
+                tabel = _combine(tabel, aggregate(nieuw, periode))
+            if dagen:
+                tabel = _recompute(tabel, data, index, dagen, periode)
+            tabellen[periode] = tabel
+        namen = self.namen
+        onbekend = set(tabellen['Maand'].index.get_level_values(stations.STATION_KEY)) - set(namen)
+        if onbekend:
+            namen = {**namen, **stations.key_names(data[data[stations.STATION_KEY].isin(onbekend)])}
+        return Rollups(tabellen, namen)
+
+    def locations(self):
+        return sorted({self.namen[sleutel] for sleutel in self.tabellen['Maand'].index.get_level_values(stations.STATION_KEY)})
+
+    def table(self, periode, kolom, locaties=None):
+        # Summary per location and period for one measurement column
+        tabel = self.tabellen[periode][kolom]
+        sleutels = tabel.index.get_level_values(stations.STATION_KEY)
+        if locaties:
+            tabel = tabel[sleutels.isin([sleutel for sleutel, naam in self.namen.items() if naam in locaties])]
+        tabel = tabel[tabel['count'] > 0]
+        index = pd.MultiIndex.from_arrays([
+            tabel.index.get_level_values(stations.STATION_KEY).map(self.namen).rename('Locatie'),
+            tabel.index.get_level_values('Periode'),
+        ])
+        return pd.DataFrame({
+            'Aantal': tabel['count'].astype(int).to_numpy(),
+            'Gemiddeld': (tabel['sum'] / tabel['count']).to_numpy(),
+            'Min': tabel['min'].to_numpy(),
+            'Max': tabel['max'].to_numpy(),
+        }, index=index)
+
+    def trend(self, periode, kolom, stat='Gemiddeld', locaties=None):
+        # One column per location, one row per period, for st.line_chart
+        return self.table(periode, kolom, locaties)[stat].unstack('Locatie')
+
+
+def build_rollups(data):
+    return Rollups({periode: aggregate(data, periode) for periode in PERIODES}, stations.key_names(data))
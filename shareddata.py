@@ -0,0 +1,206 @@
+import os
+import threading
+from collections import deque
+from typing import NamedTuple
+
+import pandas as pd
+
+import datastore
+import dateindex
+import preprocessing
+import rollups
+import stations
+
+# ---------- Gedeelde dataset ----------
+# One prepared dataset per server process, shared by all sessions instead of a
+# full copy in every session_state. A write never modifies the current frame:
+# it builds a new one and publishes it as the next snapshot, so a session that
+# is still rendering an older snapshot is not affected. Sessions only remember
+# the version they last saw.
+#
+# The dataset remembers up to which byte it has read the journal. Writes (from
+# this process or any other) are picked up by reading only the journal lines
+# after that offset and merging them into the current frame; only when the
+# store itself was rewritten (compaction, migration) is everything re-read.
+
+# Number of writes whose changed days are remembered for MapCache invalidation
+WIJZIGINGEN_LOG = 1000
+
+# How often open dashboards check the journal for new data (e.g. from ingest.py)
+VERVERS_SECONDEN = float(os.environ.get("WATERKWALITEIT_VERVERS_SECONDEN", 10))
+
+
+def prepare(df):
+    # The prepared frame plus the key trends and the location filter group on
+    df = preprocessing.prepare_frame(df)
+    df[stations.STATION_KEY] = stations.station_keys(df)
+    return df
+
+
+class Snapshot(NamedTuple):
+    versie: int
+    data: pd.DataFrame
+
+
+class SharedDataset:
+
+    def __init__(self, path=datastore.DATA_FILE):
+        self.path = path
+        self.store = datastore.backend(path)
+        self._lock = threading.Lock()
+        data, self._bron = self.store.load_with_state(path)
+        self._snapshot = Snapshot(0, prepare(data))
+        self._index = None
+        self._rollups = None
+        self._afgekeurd = None
+        self._namen = None
+        self._log = deque(maxlen=WIJZIGINGEN_LOG)  # (versie, changed days)
+        self.full_reloads = 0
+
+    def snapshot(self):
+        return self._snapshot
+
+    def date_index(self, data):
+        # Built once per snapshot and shared by all sessions looking at it
+        cached = self._index
+        if cached is None or cached[0] is not data:
+            cached = (data, dateindex.build_date_index(data))
+            self._index = cached
+        return cached[1]
+
+    def rejected_rows(self, data):
+        # The 'Afgekeurde rijen' report, built once per snapshot like date_index
+        cached = self._afgekeurd
+        if cached is None or cached[0] is not data:
+            cached = (data, preprocessing.rejected_rows(data).drop(columns=stations.STATION_KEY))
+            self._afgekeurd = cached
+        return cached[1]
+
+    def station_names(self, data):
+        # {station key: label} of the stations in this snapshot, for the
+        # location filter; built once per snapshot like date_index
+        cached = self._namen
+        if cached is None or cached[0] is not data:
+            cached = (data, stations.key_names(data))
+            self._namen = cached
+        return cached[1]
+
+    def trends(self, data):
+        # Rollups of a snapshot; built once, then kept up to date by _merge
+        cached = self._rollups
+        if cached is None or cached[0] is not data:
+            cached = (data, rollups.build_rollups(data))
+            if data is self._snapshot.data:
+                self._rollups = cached
+        return cached[1]
+
+    def range_rows(self, data, van, tot):
+        # The measurements of the days van..tot in this snapshot, for either
+        # backend; the snapshot already holds every row, so a query in SQL would
+        # only add a parse per rerun (exports do filter in SQL, see iter_range)
+        return dateindex.range_rows(data, self.date_index(data), van, tot)
+
+    def day_rows(self, data, dag):
+        return self.range_rows(data, dag, dag)
+
+    def changed_days(self, sinds):
+        # Days touched by writes after version 'sinds'; None when that is too
+        # long ago to tell (the caller then drops everything)
+        log = list(self._log)
+        if sinds == self._snapshot.versie:
+            return set()
+        if not log or log[0][0] > sinds + 1:
+            return None
+        return {dag for versie, dagen in log if versie > sinds for dag in dagen}
+
+    def _publish(self, data, dagen):
+        versie = self._snapshot.versie + 1
+        self._log.append((versie, {pd.Timestamp(d).date() for d in dagen if pd.notna(d)}))
+        self._snapshot = Snapshot(versie, data)
+        return self._snapshot
+
+    # ---------- Bijwerken vanuit de journal ----------
+    def _merge(self, entries):
+        # Same operations as datastore.apply_journal, on the prepared frame
+        vorige = data = self._snapshot.data
+        dagen = []
+        pending = []
+        toegevoegd = []
+        herberekenen = []
+        for entry in entries + [{"op": None}]:
+            if entry["op"] == "insert":
+                pending.extend(entry["rows"])
+                continue
+            if pending:
+                nieuw = prepare(datastore.rows_frame(pending, data))
+                data = preprocessing.concat_frames(data, nieuw)
+                dagen.extend(nieuw['Datum'])
+                toegevoegd.append(nieuw)
+                pending = []
+            if entry["op"] == "delete":
+                ids = data.index.intersection(entry["ids"])
+                dagen.extend(data.loc[ids, 'Datum'])
+                herberekenen.extend(data.loc[ids, 'Datum'])
+                data = data.drop(ids)
+            elif entry["op"] == "update":
+                changes = entry["changes"]
+                ids = [meting_id for meting_id in changes if meting_id in data.index]
+                # Both the old and the (possibly edited) new day of each measurement
+                herberekenen.extend(data.loc[ids, 'Datum'])
+                dagen.extend(data.loc[ids, 'Datum'])
+                data = preprocessing.refresh_rows(datastore.apply_changes(data, changes), ids)
+                data[stations.STATION_KEY] = data[stations.STATION_KEY].copy()
+                data.loc[ids, stations.STATION_KEY] = stations.station_keys(data.loc[ids])
+                dagen.extend(data.loc[ids, 'Datum'])
+                herberekenen.extend(data.loc[ids, 'Datum'])
+        snapshot = self._publish(data, dagen)
+        if self._rollups is not None and self._rollups[0] is vorige:
+            nieuw = pd.concat(toegevoegd) if toegevoegd else None
+            self._rollups = (data, self._rollups[1].updated(data, self.date_index(data), nieuw, herberekenen))
+        return snapshot
+
+    def _catch_up(self):
+        store = self.store.store_state(self.path)
+        if store != self._bron.store or self.store.journal_size(self.path) < self._bron.journal_offset:
+            return self._reload()
+        entries, offset = self.store.read_journal_from(self._bron.journal_offset, self.path)
+        if self.store.store_state(self.path) != self._bron.store:
+            return self._reload()  # compacted while the journal was read
+        if any(entry["op"] == "delete" and "ids" not in entry for entry in entries):
+            return self._reload()  # positional deletes only replay on the whole store
+        self._bron = self._bron._replace(journal_offset=offset)
+        if not entries:
+            return self._snapshot
+        return self._merge(entries)
+
+    def _reload(self):
+        self.full_reloads += 1
+        data, self._bron = self.store.load_with_state(self.path)
+        self._log.clear()
+        self._rollups = None
+        self._snapshot = Snapshot(self._snapshot.versie + 1, prepare(data))
+        return self._snapshot
+
+    def refresh(self):
+        # Cheap when nothing changed: two stats and no parsing
+        with self._lock:
+            return self._catch_up()
+
+    # ---------- Schrijven ----------
+    # The change is appended to the journal and then read back like any other
+    # journal entry, together with whatever other processes appended before it.
+    def insert(self, rows):
+        # rows are snapped where they come in (see stations.snap_rows)
+        with self._lock:
+            self.store.append_rows(rows, self.path)
+            return self._catch_up()
+
+    def delete(self, ids):
+        with self._lock:
+            self.store.delete_rows(ids, self.path)
+            return self._catch_up()
+
+    def update(self, changes):
+        with self._lock:
+            self.store.update_rows(stations.snap_changes(self._snapshot.data, changes), self.path)
+            return self._catch_up()
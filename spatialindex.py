@@ -0,0 +1,114 @@
+import os
+from typing import NamedTuple
+
+import numpy as np
+
+# ---------- Ruimtelijke index ----------
+# Grid over the parsed coordinates of a day, built once per day and map cache
+# version. A viewport query only looks at the grid columns the viewport covers,
+# so a render costs what is visible instead of every point of the day. At low
+# zoom the visible points are thinned to one per few pixels.
+
+# Grid cell size in degrees (~1 km in Amsterdam)
+CEL_GRAD = 0.01
+
+# Extra area around the viewport that is sent along, as a fraction of its size,
+# so a small pan does not show an empty edge
+VIEWPORT_MARGE = 0.25
+
+# One point per LOD_PIXELS x LOD_PIXELS screen pixels below VOLLEDIG_ZOOM
+LOD_PIXELS = 12
+VOLLEDIG_ZOOM = 17
+
+# Upper bound on the points sent for one viewport; above it the thinning cells
+# are made larger, whatever the zoom
+MAX_PUNTEN = int(os.environ.get("WATERKWALITEIT_MAX_PUNTEN", 2000))
+
+# pH colour -> rank; when thinning, a cell shows its most severe point
+ERNST = {'gray': 0, 'green': 1, 'orange': 2, 'red': 3}
+
+
+class GridIndex(NamedTuple):
+    order: np.ndarray   # point positions sorted on cell key
+    keys: np.ndarray    # cell key (column * rijen + row) in that order
+    rijen: int          # number of grid rows
+    lat0: float         # south-west corner of the grid
+    lon0: float
+    lat: np.ndarray     # coordinates and severity per point position
+    lon: np.ndarray
+    ernst: np.ndarray
+
+
+def _cel(waarde, oorsprong):
+    return np.floor((waarde - oorsprong) / CEL_GRAD).astype(np.int64)
+
+
+def build_grid_index(punten):
+    # punten: rows with valid coordinates; positions are row positions in punten
+    lat = punten['lat'].to_numpy(dtype='float64')
+    lon = punten['lon'].to_numpy(dtype='float64')
+    ernst = punten['kleur'].astype(str).map(ERNST).fillna(0).to_numpy(dtype=np.int8)
+    lat0 = float(lat.min()) if len(lat) else 0.0
+    lon0 = float(lon.min()) if len(lon) else 0.0
+    rij = _cel(lat, lat0)
+    rijen = int(rij.max()) + 1 if len(rij) else 1
+    keys = _cel(lon, lon0) * rijen + rij
+    order = np.argsort(keys, kind='stable')
+    return GridIndex(order, keys[order], rijen, lat0, lon0, lat, lon, ernst)
+
+
+def box_positions(index, zuid, west, noord, oost):
+    # Positions of the points inside the box, one binary search per grid column
+    if not len(index.order):
+        return index.order
+    rij_lo = max(0, int(np.floor((zuid - index.lat0) / CEL_GRAD)))
+    rij_hi = min(index.rijen - 1, int(np.floor((noord - index.lat0) / CEL_GRAD)))
+    kol_lo = max(0, int(np.floor((west - index.lon0) / CEL_GRAD)))
+    kol_hi = min(int(index.keys[-1] // index.rijen), int(np.floor((oost - index.lon0) / CEL_GRAD)))
+    if rij_lo > rij_hi or kol_lo > kol_hi:
+        return index.order[:0]
+    kolommen = np.arange(kol_lo, kol_hi + 1) * index.rijen
+    lo = np.searchsorted(index.keys, kolommen + rij_lo, side='left')
+    hi = np.searchsorted(index.keys, kolommen + rij_hi, side='right')
+    kandidaten = np.concatenate([index.order[a:b] for a, b in zip(lo, hi)])
+    # The edge cells stick out of the box
+    lat = index.lat[kandidaten]
+    lon = index.lon[kandidaten]
+    binnen = (lat >= zuid) & (lat <= noord) & (lon >= west) & (lon <= oost)
+    return np.sort(kandidaten[binnen])
+
+
+def thin(index, posities, zoom, breedtegraad, min_graden=0.0):
+    # Keeps the most severe point per LOD cell of LOD_PIXELS screen pixels, or
+    # of min_graden degrees of longitude when that is larger
+    graden_lon = max(LOD_PIXELS * 360 / (256 * 2 ** zoom) if zoom < VOLLEDIG_ZOOM else 0.0, min_graden)
+    if not graden_lon or not len(posities):
+        return posities
+    graden_lat = graden_lon * np.cos(np.radians(breedtegraad))
+    kol = np.floor(index.lon[posities] / graden_lon).astype(np.int64)
+    rij = np.floor(index.lat[posities] / graden_lat).astype(np.int64)
+    # Most severe first, so np.unique picks it as the first of its cell
+    volgorde = np.argsort(-index.ernst[posities], kind='stable')
+    cellen = np.stack([kol[volgorde], rij[volgorde]], axis=1)
+    _, eerste = np.unique(cellen, axis=0, return_index=True)
+    return np.sort(posities[volgorde[eerste]])
+
+
+def extent(index):
+    # (zuid, west, noord, oost) of all points
+    if not len(index.lat):
+        return (0.0, 0.0, 0.0, 0.0)
+    return (index.lat.min(), index.lon.min(), index.lat.max(), index.lon.max())
+
+
+def viewport_positions(index, zuid, west, noord, oost, zoom, marge=VIEWPORT_MARGE):
+    rand_lat = marge * (noord - zuid)
+    rand_lon = marge * (oost - west)
+    zuid, west, noord, oost = zuid - rand_lat, west - rand_lon, noord + rand_lat, oost + rand_lon
+    posities = box_positions(index, zuid, west, noord, oost)
+    breedtegraad = (zuid + noord) / 2
+    min_graden = 0.0
+    if len(posities) > MAX_PUNTEN:
+        # Cells such that the box holds at most about MAX_PUNTEN of them
+        min_graden = np.sqrt((oost - west) * (noord - zuid) / np.cos(np.radians(breedtegraad)) / MAX_PUNTEN)
+    return thin(index, posities, zoom, breedtegraad, min_graden)
@@ -0,0 +1,298 @@
+import contextlib
+import json
+import os
+import sqlite3
+
+import pandas as pd
+
+import datastore
+import preprocessing
+
+# ---------- SQLite backend ----------
+# Optional alternative to the Parquet store plus journal file, chosen by giving
+# the data file a .sqlite/.db extension, e.g.
+# WATERKWALITEIT_DATA_FILE=Waterkwaliteit.sqlite. The functions mirror those in
+# datastore.py, see datastore.backend().
+#
+# WAL mode lets the dashboards read while a session or the ingestion service
+# writes. Every write also records its operation in the 'journal' table, so the
+# shared dataset picks up changes the same way as with the journal file: the
+# sequence number plays the role of the byte offset, and 'generatie' changes
+# when the table is rewritten (migration, compaction). Date ranges are queried
+# in SQL on an index, so an export only reads the rows it needs.
+
+# The journal table is emptied by the write that takes it past this many operations
+COMPACT_ROWS = int(os.environ.get("WATERKWALITEIT_COMPACT_ROWS", 10_000))
+
+# SQLite limits the number of parameters per statement
+PARAMS_PER_QUERY = 500
+
+NUMERIEKE_KOLOMMEN = preprocessing.MEASUREMENT_COLUMNS
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS metingen (meting_id TEXT PRIMARY KEY, lat REAL, lon REAL);
+CREATE TABLE IF NOT EXISTS journal (seq INTEGER PRIMARY KEY AUTOINCREMENT, entry TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS meta (sleutel TEXT PRIMARY KEY, waarde INTEGER NOT NULL);
+INSERT OR IGNORE INTO meta VALUES ('generatie', 0);
+"""
+
+_INDEXES = """
+CREATE INDEX IF NOT EXISTS metingen_datum ON metingen ("Datum");
+CREATE INDEX IF NOT EXISTS metingen_locatie ON metingen ("Locatie");
+CREATE INDEX IF NOT EXISTS metingen_coordinaten ON metingen (lat, lon);
+"""
+
+_aangemaakt = set()
+
+
+def _q(naam):
+    return '"' + naam.replace('"', '""') + '"'
+
+
+def connect(path=datastore.DATA_FILE):
+    # Autocommit connection; transactions are started explicitly
+    nieuw = not os.path.exists(path)
+    conn = sqlite3.connect(path, timeout=30, isolation_level=None)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    if nieuw or path not in _aangemaakt:
+        conn.executescript(_SCHEMA)
+        _ensure_columns(conn, datastore.COLUMNS)
+        conn.executescript(_INDEXES)
+        _aangemaakt.add(path)
+    return conn
+
+
+@contextlib.contextmanager
+def _transaction(path):
+    with contextlib.closing(connect(path)) as conn:
+        # IMMEDIATE takes the write lock up front, writers queue instead of failing halfway
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+
+def _ensure_columns(conn, kolommen):
+    # Columns that only some workbooks have (e.g. 'Windrichting') are added when they show up
+    bestaand = {row[1] for row in conn.execute("PRAGMA table_info(metingen)")}
+    for col in kolommen:
+        if col not in bestaand and col not in (datastore.ID_COLUMN, 'lat', 'lon'):
+            soort = "REAL" if col in NUMERIEKE_KOLOMMEN else "INTEGER" if col == datastore.STATION_COLUMN else "TEXT"
+            conn.execute(f"ALTER TABLE metingen ADD COLUMN {_q(col)} {soort}")
+            bestaand.add(col)
+
+
+def _sql_value(col, value):
+    if col in datastore.DATE_COLUMNS:
+        # ISO text, so date ranges compare correctly as strings and use the index
+        if not isinstance(value, pd.Timestamp):
+            value = pd.to_datetime(value, errors='coerce')
+        return None if pd.isna(value) else value.isoformat()
+    value = datastore._json_value(value)
+    if value is None or isinstance(value, (int, float, str, bytes)):
+        return value
+    return str(value)
+
+
+def _frame(df):
+    # Rows from SQL in the same shape as datastore.read_store
+    df = df.drop(columns=['lat', 'lon'], errors='ignore')
+    for col in datastore.DATE_COLUMNS:
+        df[col] = pd.to_datetime(df[col], format='ISO8601', errors='coerce')
+    for col in datastore.COLUMNS:
+        if col not in df.columns:
+            df[col] = None
+    return datastore.with_ids(df)
+
+
+def _coordinates(rows):
+    coords = preprocessing.parse_coordinates(pd.DataFrame({'Coordinaten': [row.get('Coordinaten') for row in rows]}))
+    return coords['lat'].astype(object).where(coords['coord_ok'], None).tolist(), \
+        coords['lon'].astype(object).where(coords['coord_ok'], None).tolist()
+
+
+def _insert(conn, rows):
+    # rows: already converted with _sql_value
+    kolommen = list(dict.fromkeys(col for row in rows for col in row if col != datastore.ID_COLUMN))
+    _ensure_columns(conn, kolommen)
+    lat, lon = _coordinates(rows)
+    namen = ", ".join(_q(col) for col in [datastore.ID_COLUMN, 'lat', 'lon'] + kolommen)
+    plaatsen = ", ".join("?" * (len(kolommen) + 3))
+    conn.executemany(
+        f"INSERT OR REPLACE INTO metingen ({namen}) VALUES ({plaatsen})",
+        (
+            [row[datastore.ID_COLUMN], la, lo] + [row.get(col) for col in kolommen]
+            for row, la, lo in zip(rows, lat, lon)
+        ),
+    )
+
+
+def _journal(conn, entry):
+    conn.execute("INSERT INTO journal (entry) VALUES (?)", (json.dumps(entry, default=str, ensure_ascii=False),))
+    # Same transaction as the write, so the table already holds this change
+    if conn.execute("SELECT count(*) FROM journal").fetchone()[0] > COMPACT_ROWS:
+        conn.execute("DELETE FROM journal")
+        _new_generation(conn)
+
+
+def _new_generation(conn):
+    conn.execute("UPDATE meta SET waarde = waarde + 1 WHERE sleutel = 'generatie'")
+
+
+# ---------- Schrijven ----------
+def append_rows(rows, path=datastore.DATA_FILE):
+    if isinstance(rows, pd.DataFrame):
+        rows = rows.reset_index().to_dict('records') if rows.index.name == datastore.ID_COLUMN else rows.to_dict('records')
+    rows = [{col: _sql_value(col, val) for col, val in row.items()} for row in rows]
+    for row in rows:
+        if not row.get(datastore.ID_COLUMN):
+            row[datastore.ID_COLUMN] = datastore.new_id()
+    if rows:
+        with _transaction(path) as conn:
+            _insert(conn, rows)
+            _journal(conn, {"op": "insert", "rows": rows})
+    return [row[datastore.ID_COLUMN] for row in rows]
+
+
+def delete_rows(ids, path=datastore.DATA_FILE):
+    ids = [str(meting_id) for meting_id in ids]
+    if ids:
+        with _transaction(path) as conn:
+            for pos in range(0, len(ids), PARAMS_PER_QUERY):
+                deel = ids[pos:pos + PARAMS_PER_QUERY]
+                conn.execute(f"DELETE FROM metingen WHERE meting_id IN ({', '.join('?' * len(deel))})", deel)
+            _journal(conn, {"op": "delete", "ids": ids})
+
+
+def update_rows(changes, path=datastore.DATA_FILE):
+    # changes: {meting_id: {kolom: nieuwe waarde}}
+    changes = {
+        str(meting_id): {col: _sql_value(col, val) for col, val in values.items()}
+        for meting_id, values in changes.items() if values
+    }
+    if not changes:
+        return
+    with _transaction(path) as conn:
+        _ensure_columns(conn, {col for values in changes.values() for col in values})
+        for meting_id, values in changes.items():
+            values = dict(values)
+            if 'Coordinaten' in values:
+                (lat,), (lon,) = _coordinates([values])
+                values.update(lat=lat, lon=lon)
+            toewijzing = ", ".join(f"{_q(col)} = ?" for col in values)
+            conn.execute(f"UPDATE metingen SET {toewijzing} WHERE meting_id = ?", [*values.values(), meting_id])
+        _journal(conn, {"op": "update", "changes": changes})
+
+
+def migrate_excel(excel_files, path=datastore.DATA_FILE, dedupe=False):
+    frames = [datastore.read_excel(f) for f in excel_files]
+    df = pd.concat(frames) if frames else datastore.empty_frame()
+    if dedupe:
+        df = df.drop_duplicates()
+    return replace_store(df, path)
+
+
+def replace_store(df, path=datastore.DATA_FILE):
+    rows = [{col: _sql_value(col, val) for col, val in row.items()} for row in df.reset_index().to_dict('records')]
+    with _transaction(path) as conn:
+        conn.execute("DELETE FROM metingen")
+        conn.execute("DELETE FROM journal")
+        if rows:
+            _insert(conn, rows)
+        _new_generation(conn)
+    return df
+
+
+def compact(path=datastore.DATA_FILE):
+    # The table already holds every change; only the journal table is emptied
+    with _transaction(path) as conn:
+        conn.execute("DELETE FROM journal")
+        _new_generation(conn)
+    return load(path, excel_file=None)
+
+
+# ---------- Lezen ----------
+def store_state(path=datastore.DATA_FILE):
+    if not os.path.exists(path):
+        return None
+    with contextlib.closing(connect(path)) as conn:
+        return conn.execute("SELECT waarde FROM meta WHERE sleutel = 'generatie'").fetchone()[0]
+
+
+def _last_seq(conn):
+    # AUTOINCREMENT never reuses numbers, also not after the journal was emptied
+    row = conn.execute("SELECT seq FROM sqlite_sequence WHERE name = 'journal'").fetchone()
+    return row[0] if row else 0
+
+
+def journal_size(path=datastore.DATA_FILE):
+    if not os.path.exists(path):
+        return 0
+    with contextlib.closing(connect(path)) as conn:
+        return _last_seq(conn)
+
+
+def data_version(path=datastore.DATA_FILE):
+    return (store_state(path), journal_size(path))
+
+
+def read_journal_from(offset, path=datastore.DATA_FILE):
+    with contextlib.closing(connect(path)) as conn:
+        rows = conn.execute("SELECT seq, entry FROM journal WHERE seq > ? ORDER BY seq", (offset,)).fetchall()
+    if not rows:
+        return [], offset
+    return [json.loads(entry) for _, entry in rows], rows[-1][0]
+
+
+def load(path=datastore.DATA_FILE, excel_file=datastore.EXCEL_FILE):
+    return load_with_state(path, excel_file)[0]
+
+
+def load_with_state(path=datastore.DATA_FILE, excel_file=datastore.EXCEL_FILE):
+    # First run on an existing installation: import the workbook once
+    if not os.path.exists(path) and excel_file and os.path.exists(excel_file):
+        migrate_excel([excel_file], path)
+    with contextlib.closing(connect(path)) as conn:
+        te_groot = conn.execute("SELECT count(*) FROM journal").fetchone()[0] > COMPACT_ROWS
+    if te_groot:
+        compact(path)
+    with contextlib.closing(connect(path)) as conn:
+        # One read transaction, so the rows and the journal position belong together
+        conn.execute("BEGIN")
+        generatie = conn.execute("SELECT waarde FROM meta WHERE sleutel = 'generatie'").fetchone()[0]
+        offset = _last_seq(conn)
+        df = _frame(pd.read_sql_query("SELECT * FROM metingen", conn))
+        conn.execute("COMMIT")
+    return df, datastore.LoadState(generatie, offset)
+
+
+def iter_range(start, end, path=datastore.DATA_FILE, batch_rows=50_000, voortgang=None):
+    # Same contract as datastore.iter_range, but the date filter runs in SQL on
+    # the 'Datum' index instead of over every batch of the store
+    van = pd.Timestamp(start).normalize()
+    tot = pd.Timestamp(end).normalize() + pd.Timedelta(days=1)
+    params = (van.isoformat(), tot.isoformat())
+    with contextlib.closing(connect(path)) as conn:
+        conn.execute("BEGIN")
+        totaal = conn.execute('SELECT count(*) FROM metingen WHERE "Datum" >= ? AND "Datum" < ?', params).fetchone()[0]
+        gelezen = 0
+        for chunk in pd.read_sql_query(
+            'SELECT * FROM metingen WHERE "Datum" >= ? AND "Datum" < ? ORDER BY "Datum"',
+            conn, params=params, chunksize=batch_rows,
+        ):
+            gelezen += len(chunk)
+            yield _frame(chunk)
+            if voortgang:
+                voortgang(gelezen / max(1, totaal))
+        conn.execute("COMMIT")
+
+
+def range_frame(start, end, path=datastore.DATA_FILE):
+    # One date range as a frame, straight from the table (the dashboards use the
+    # snapshot of the shared dataset instead)
+    frames = list(iter_range(start, end, path))
+    return pd.concat(frames) if frames else datastore.empty_frame()
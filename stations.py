@@ -0,0 +1,240 @@
+import argparse
+import os
+import zlib
+
+import numpy as np
+import pandas as pd
+from scipy.spatial import cKDTree
+
+import datastore
+import preprocessing
+
+# ---------- Meetstations ----------
+# Registry of the known stations (station_id, naam, lat, lon), kept as a small
+# CSV next to the store so it can be edited by hand. New readings are snapped
+# to the nearest station within TOLERANTIE_M and get its 'station_id'. The
+# trends and the location filter group on that integer key (see station_keys)
+# instead of the free-text 'Locatie', with the registry name as label.
+# 'Locatie' and the measured 'Coordinaten' stay on every row as they came in;
+# the store dictionary-encodes these repeated strings, so they cost little.
+#
+#   python stations.py build   registry from the measurements already stored
+#   python stations.py snap    give the stored measurements their station
+
+STATIONS_FILE = os.environ.get("WATERKWALITEIT_STATIONS_FILE", "stations.csv")
+
+# Readings further than this from every station are stored as they came in
+TOLERANTIE_M = float(os.environ.get("WATERKWALITEIT_STATION_TOLERANTIE_M", 100))
+
+METER_PER_GRAAD = 111_320
+
+# Derived column of the prepared dataset: the key a measurement is grouped on
+STATION_KEY = 'station'
+
+_geladen = {}
+
+
+class StationRegistry:
+
+    def __init__(self, stations):
+        # stations: frame indexed by station_id with 'naam', 'lat' and 'lon'
+        self.stations = stations
+        self._breedtegraad = float(stations['lat'].mean()) if len(stations) else 0.0
+        self._tree = cKDTree(self._meters(stations['lat'], stations['lon'])) if len(stations) else None
+
+    def _meters(self, lat, lon):
+        # Local flat projection, accurate to well under a metre across a city
+        x = np.asarray(lon, dtype='float64') * METER_PER_GRAAD * np.cos(np.radians(self._breedtegraad))
+        y = np.asarray(lat, dtype='float64') * METER_PER_GRAAD
+        return np.column_stack([x, y])
+
+    def snap(self, lat, lon, tolerantie_m=TOLERANTIE_M):
+        # station_id of the nearest station per point, -1 when none is close enough
+        lat = np.asarray(lat, dtype='float64')
+        ids = np.full(len(lat), -1, dtype=np.int64)
+        geldig = ~(np.isnan(lat) | np.isnan(np.asarray(lon, dtype='float64')))
+        if self._tree is None or not geldig.any():
+            return ids
+        afstand, positie = self._tree.query(self._meters(lat[geldig], np.asarray(lon)[geldig]), distance_upper_bound=tolerantie_m)
+        gevonden = np.isfinite(afstand)
+        ids[np.flatnonzero(geldig)[gevonden]] = self.stations.index.to_numpy()[positie[gevonden]]
+        return ids
+
+    def coordinates(self, station_id):
+        station = self.stations.loc[station_id]
+        return f"{station['lat']:.7f}, {station['lon']:.7f}"
+
+
+def empty_registry():
+    return pd.DataFrame({'naam': pd.Series(dtype=object), 'lat': pd.Series(dtype='float64'), 'lon': pd.Series(dtype='float64')},
+                        index=pd.Index([], dtype='int64', name=datastore.STATION_COLUMN))
+
+
+def read_registry(path=STATIONS_FILE):
+    try:
+        return pd.read_csv(path, index_col=datastore.STATION_COLUMN)
+    except FileNotFoundError:
+        return empty_registry()
+
+
+def write_registry(stations, path=STATIONS_FILE):
+    tmp_path = f"{path}.tmp"
+    stations.to_csv(tmp_path)
+    os.replace(tmp_path, path)
+
+
+def registry(path=STATIONS_FILE):
+    # Re-read only when the file changed, so writers can call this per batch
+    versie = os.stat(path).st_mtime_ns if os.path.exists(path) else None
+    geladen = _geladen.get(path)
+    if geladen is None or geladen[0] != versie:
+        geladen = (versie, StationRegistry(read_registry(path)))
+        _geladen[path] = geladen
+    return geladen[1]
+
+
+def _leeg(waarde):
+    return waarde is None or (pd.api.types.is_scalar(waarde) and pd.isna(waarde)) or not str(waarde).strip()
+
+
+def snap_rows(rows, path=STATIONS_FILE):
+    # Copies of the rows with the 'station_id' of the nearest station. Rows are
+    # snapped once, where they come in and before they are validated, so a
+    # reading with only a station name gets its coordinates instead of being
+    # rejected. A row
+    # without 'Locatie' gets the name of its station; a row without (valid)
+    # coordinates whose 'Locatie' is a station name gets that station's id and
+    # coordinates. Measured coordinates are never replaced.
+    rows = [dict(row) for row in rows]
+    stations = registry(path)
+    if not rows or not len(stations.stations):
+        return rows
+    per_naam = dict(zip(stations.stations['naam'].astype(str).str.strip(), stations.stations.index))
+    coords = preprocessing.parse_coordinates(pd.DataFrame({'Coordinaten': [row.get('Coordinaten') for row in rows]}))
+    for row, station_id, coord_ok in zip(rows, stations.snap(coords['lat'], coords['lon']), coords['coord_ok']):
+        locatie = row.get('Locatie')
+        if not coord_ok and not _leeg(locatie) and str(locatie).strip() in per_naam:
+            station_id = per_naam[str(locatie).strip()]
+            row['Coordinaten'] = stations.coordinates(station_id)
+        if station_id < 0:
+            continue
+        row[datastore.STATION_COLUMN] = int(station_id)
+        if _leeg(locatie):
+            row['Locatie'] = stations.stations.loc[station_id, 'naam']
+    return rows
+
+
+def snap_frame(df, path=STATIONS_FILE):
+    # snap_rows for a frame
+    if df.empty or not len(registry(path).stations):
+        return df
+    return pd.DataFrame(snap_rows(df.to_dict('records'), path), index=df.index)
+
+
+# ---------- Groeperen per station ----------
+def _naam_sleutel(naam):
+    # Negative, so it never equals a station_id
+    return -1 - zlib.crc32(naam.encode("utf-8"))
+
+
+def station_keys(df, path=STATIONS_FILE):
+    # Integer key per measurement: its station_id; without one, the station
+    # whose name is its 'Locatie'; else a key of its own per location name, so
+    # measurements away from every station are still grouped by their name
+    locatie = df['Locatie']
+    if not isinstance(locatie.dtype, pd.CategoricalDtype):
+        locatie = locatie.astype('category')
+    stations = registry(path).stations
+    per_naam = dict(zip(stations['naam'].astype(str).str.strip(), stations.index))
+    namen = locatie.cat.categories.astype(str).str.strip()
+    per_code = np.array([per_naam.get(naam, _naam_sleutel(naam)) for naam in namen] + [0], dtype=np.int64)
+    codes = locatie.cat.codes.to_numpy()
+    sleutels = pd.array(per_code[codes], dtype='Int64')
+    sleutels[codes < 0] = pd.NA
+    station_id = pd.to_numeric(df.get(datastore.STATION_COLUMN, pd.Series(np.nan, index=df.index)), errors='coerce')
+    station_id = station_id.to_numpy(dtype='float64', na_value=np.nan)
+    heeft_station = ~np.isnan(station_id)
+    sleutels[heeft_station] = station_id[heeft_station].astype(np.int64)
+    return pd.Series(sleutels, index=df.index, name=STATION_KEY)
+
+
+def key_names(df, path=STATIONS_FILE):
+    # {key: label} for the keys in df: the registry name of a station,
+    # otherwise the location name of its measurements
+    namen = df.groupby(STATION_KEY, observed=True)['Locatie'].first()
+    geregistreerd = registry(path).stations['naam']
+    return {int(sleutel): str(geregistreerd.get(sleutel, naam)) for sleutel, naam in namen.items()}
+
+
+def build_registry(df):
+    # One station per location: the median of its valid coordinates
+    coords = preprocessing.parse_coordinates(df[['Locatie', 'Coordinaten']].copy())
+    coords = coords[coords['coord_ok'] & coords['Locatie'].notna()]
+    stations = coords.groupby(coords['Locatie'].astype(str))[['lat', 'lon']].median().round(7)
+    stations = stations.reset_index().rename(columns={'Locatie': 'naam'})
+    stations.index = pd.RangeIndex(1, len(stations) + 1, name=datastore.STATION_COLUMN)
+    return stations
+
+
+def _gewijzigd(oud, nieuw):
+    if pd.isna(oud) or pd.isna(nieuw):
+        return pd.isna(oud) != pd.isna(nieuw)
+    return oud != nieuw
+
+
+def snap_changes(df, changes, path=STATIONS_FILE):
+    # Edits of 'Locatie' or 'Coordinaten' are snapped again like new rows, so
+    # the station_id follows the edit (None when no station is near)
+    kolommen = ['Locatie', 'Coordinaten']
+    ids = [meting_id for meting_id, wijziging in changes.items()
+           if meting_id in df.index and not set(wijziging).isdisjoint(kolommen)]
+    if not ids:
+        return changes
+    huidig = df.loc[ids].reindex(columns=kolommen + [datastore.STATION_COLUMN]).astype(object).to_dict('index')
+    rows = [dict(huidig[meting_id], **{col: changes[meting_id][col] for col in kolommen if col in changes[meting_id]})
+            for meting_id in ids]
+    changes = dict(changes)
+    for meting_id, oud, row in zip(ids, rows, snap_rows([{col: rij[col] for col in kolommen} for rij in rows], path)):
+        row.setdefault(datastore.STATION_COLUMN, None)
+        gesnapt = {col: row[col] for col in row if _gewijzigd(oud[col], row[col])}
+        changes[meting_id] = dict(changes[meting_id], **gesnapt)
+    return changes
+
+
+def snap_store(path=datastore.DATA_FILE, stations_file=STATIONS_FILE):
+    # Existing measurements as one update (only the cells snapping changed),
+    # then compacted into the store
+    store = datastore.backend(path)
+    df = store.load(path, excel_file=None)
+    kolommen = ['Locatie', 'Coordinaten', datastore.STATION_COLUMN]
+    origineel = df[kolommen].reset_index().to_dict('records')
+    changes = {}
+    for oud, row in zip(origineel, snap_rows(origineel, stations_file)):
+        gewijzigd = {col: row[col] for col in kolommen if _gewijzigd(oud[col], row[col])}
+        if gewijzigd:
+            changes[row[datastore.ID_COLUMN]] = gewijzigd
+    store.update_rows(changes, path)
+    store.compact(path)
+    return len(changes), len(df)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Register van meetstations")
+    parser.add_argument("--data-file", default=datastore.DATA_FILE, help="Pad naar de Parquet store of SQLite database")
+    parser.add_argument("--stations-file", default=STATIONS_FILE)
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("build", help="Register opbouwen uit de opgeslagen metingen")
+    commands.add_parser("snap", help="Opgeslagen metingen aan het dichtstbijzijnde station koppelen")
+
+    args = parser.parse_args(argv)
+    if args.command == "build":
+        stations = build_registry(datastore.backend(args.data_file).load(args.data_file, excel_file=None))
+        write_registry(stations, args.stations_file)
+        print(f"{len(stations)} stations opgeslagen in {args.stations_file}")
+    elif args.command == "snap":
+        gekoppeld, totaal = snap_store(args.data_file, args.stations_file)
+        print(f"{gekoppeld} van {totaal} metingen gekoppeld aan een station")
+
+
+if __name__ == "__main__":
+    main()
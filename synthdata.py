@@ -0,0 +1,153 @@
+import argparse
+import os
+
+import numpy as np
+import pandas as pd
+
+import datastore
+
+# ---------- Synthetische meetdata ----------
+# Generates datasets that look like the Waterkwaliteit workbook, at any size,
+# for benchmark.py and for trying the dashboards on realistic volumes. The rows
+# carry the same dirt as the real sheets: comma decimals typed in Excel,
+# coordinates that are missing or malformed, and measurements without a date.
+#
+#   python synthdata.py 1000 100000 1000000 [--map bench] [--formaten xlsx parquet sqlite]
+
+# The five locations of the first measurement round; further stations are
+# spread over the city around them
+BASIS_STATIONS = [
+    ('Weesperplein', 52.3597533, 4.9070122),
+    ('Spaklerweg', 52.3406215, 4.9161200),
+    ('Waterlooplein', 52.3659139, 4.9005303),
+    ('Rokin', 52.3677279, 4.8938338),
+    ('Keizersgracht', 52.3674163, 4.8847137),
+]
+
+# Fraction of the rows with each kind of dirt
+KOMMA_FRACTIE = 0.02
+SLECHTE_COORDINATEN_FRACTIE = 0.01
+ZONDER_DATUM_FRACTIE = 0.005
+
+SLECHTE_COORDINATEN = ['', None, '52.36;4.90', '152.3597533, 4.9070122', 'onbekend', '52.3597533']
+
+WINDRICHTINGEN = ['Noord', 'Noord/oost', 'Oost', 'Zuid/oost', 'Zuid', 'Zuid/west', 'West', 'Noord/west']
+
+# The workbook as uploaded (xlsx, csv) and as stored by either backend (parquet,
+# sqlite; see datastore.backend)
+FORMATEN = ['xlsx', 'csv', 'parquet', 'sqlite']
+
+
+def stations(aantal, seed=0):
+    rng = np.random.default_rng(seed)
+    extra = max(0, aantal - len(BASIS_STATIONS))
+    lat = rng.uniform(52.33, 52.39, extra).round(7)
+    lon = rng.uniform(4.85, 4.95, extra).round(7)
+    namen = [f"Meetpunt {i}" for i in range(len(BASIS_STATIONS) + 1, aantal + 1)]
+    basis = BASIS_STATIONS[:aantal]
+    return pd.DataFrame({
+        'naam': [naam for naam, _, _ in basis] + namen,
+        'lat': [la for _, la, _ in basis] + list(lat),
+        'lon': [lo for _, _, lo in basis] + list(lon),
+    })
+
+
+def _kloktijd(tijdstip):
+    # "12.30", as in the 'Tijdstip' column of the sheet
+    return tijdstip.dt.hour.astype(str) + "." + tijdstip.dt.minute.astype(str).str.zfill(2)
+
+
+def _komma(values, rng):
+    # Some values as text with a decimal comma, the way they arrive from Excel
+    values = values.astype(object)
+    rijen = rng.random(len(values)) < KOMMA_FRACTIE
+    values[rijen] = [f"{v:.2f}".replace('.', ',') for v in values[rijen]]
+    return values
+
+
+def generate(rijen, dagen=365, aantal_stations=50, start='2024-01-01', seed=0):
+    rng = np.random.default_rng(seed)
+    locaties = stations(aantal_stations, seed)
+    station = rng.integers(0, len(locaties), rijen)
+
+    # Rounds during working hours, sorted like an appended sheet
+    dag = pd.Timestamp(start) + pd.to_timedelta(rng.integers(0, dagen, rijen), unit='D')
+    tijd = pd.to_timedelta(rng.integers(8 * 60, 18 * 60, rijen), unit='min')
+    datum = pd.DatetimeIndex(dag + tijd).sort_values()
+    meetdag = datum.normalize()
+
+    # Water follows the season; EC, CF and TDS move together as with the probes
+    seizoen = np.sin(2 * np.pi * (datum.dayofyear.to_numpy() - 110) / 365)
+    temperatuur = (13 + 7 * seizoen + rng.normal(0, 1.5, rijen)).round(1)
+    ec = rng.gamma(9, 0.25, rijen).round(2)
+    df = pd.DataFrame({
+        'Meetdag': meetdag,
+        'Tijdstip': (_kloktijd(pd.Series(datum)) + "-" + _kloktijd(pd.Series(datum + pd.Timedelta(minutes=15)))).to_numpy(),
+        'Datum': datum,
+        'Locatie': locaties['naam'].to_numpy()[station],
+        'Coordinaten': (locaties['lat'].map("{:.7f}".format) + ", " + locaties['lon'].map("{:.7f}".format)).to_numpy()[station],
+        'PH': rng.normal(8.2, 0.7, rijen).clip(4, 11).round(2),
+        'Temperatuur': temperatuur,
+        'ORP': rng.normal(350, 80, rijen).round().astype(int),
+        'EC': ec,
+        'CF': (ec * 10).round(1),
+        'TDS': (ec * 500).round().astype(int),
+        'Humidity': rng.uniform(0.1, 0.4, rijen).round(2),
+        'zon/schaduw': rng.choice(['zon', 'schaduw'], rijen),
+        'meetpunt': rng.choice(['kade', 'steiger'], rijen),
+        'Buitentemperatuur': (temperatuur + rng.normal(2, 3, rijen)).round().astype(int),
+        'Windrichting': rng.choice(WINDRICHTINGEN, rijen),
+        'Windsnelheid': (pd.Series(rng.integers(0, 40, rijen)).astype(str) + "km/u").to_numpy(),
+    })
+
+    for col in ['PH', 'Temperatuur', 'EC']:
+        df[col] = _komma(df[col], rng)
+    slecht = rng.random(rijen) < SLECHTE_COORDINATEN_FRACTIE
+    df.loc[slecht, 'Coordinaten'] = rng.choice(np.array(SLECHTE_COORDINATEN, dtype=object), slecht.sum())
+    zonder_datum = rng.random(rijen) < ZONDER_DATUM_FRACTIE
+    df.loc[zonder_datum, ['Meetdag', 'Datum']] = pd.NaT
+    return df
+
+
+def file_name(rijen, formaat):
+    return f"waterkwaliteit_{rijen}.{formaat}"
+
+
+def write_dataset(df, path):
+    formaat = os.path.splitext(path)[1].lstrip('.')
+    if formaat == 'xlsx':
+        df.to_excel(path, index=False, engine='xlsxwriter')
+    elif formaat == 'csv':
+        df.to_csv(path, index=False, date_format="%Y-%m-%d %H:%M:%S")
+    else:
+        # As after 'datastore.py migrate' of the same workbook
+        if os.path.exists(path):
+            os.remove(path)
+        store = datastore.backend(path)
+        store.replace_store(datastore.with_ids(datastore.normalize_frame(df.copy())), path)
+    return path
+
+
+def generate_files(rijen, map_='.', formaten=FORMATEN, **opties):
+    df = generate(rijen, **opties)
+    os.makedirs(map_, exist_ok=True)
+    return [write_dataset(df, os.path.join(map_, file_name(rijen, formaat))) for formaat in formaten]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Synthetische waterkwaliteit datasets")
+    parser.add_argument("rijen", type=int, nargs="+", help="Aantal metingen per dataset")
+    parser.add_argument("--map", default=".", help="Map voor de bestanden")
+    parser.add_argument("--formaten", nargs="+", choices=FORMATEN, default=FORMATEN)
+    parser.add_argument("--dagen", type=int, default=365)
+    parser.add_argument("--stations", type=int, default=50)
+    parser.add_argument("--seed", type=int, default=0)
+
+    args = parser.parse_args(argv)
+    for rijen in args.rijen:
+        for path in generate_files(rijen, args.map, args.formaten, dagen=args.dagen, aantal_stations=args.stations, seed=args.seed):
+            print(f"{rijen} metingen geschreven naar {path}")
+
+
+if __name__ == "__main__":
+    main()
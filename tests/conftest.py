@@ -0,0 +1,35 @@
+import os
+import sys
+
+import pandas as pd
+import pytest
+
+# The modules live at the top of the repository, not in a package
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import datastore
+
+
+@pytest.fixture
+def rij():
+    # One measurement as the form, an upload or a sensor sends it; 'Datum' as
+    # a Timestamp, so normalize_frame does not guess the day-first order
+    def maak(locatie='Rokin', datum='2025-05-20T12:30:00', ph=7.0, coordinaten='52.3677279, 4.8938338', **waardes):
+        datum = pd.Timestamp(datum) if datum is not None else None
+        return dict({'Locatie': locatie, 'Coordinaten': coordinaten, 'PH': ph, 'Datum': datum}, **waardes)
+    return maak
+
+
+@pytest.fixture
+def maak_store(tmp_path, monkeypatch):
+    # A store in tmp_path holding the given rows, for either backend. The tests
+    # run in tmp_path, so no workbook or stations.csv of the repository is used.
+    monkeypatch.chdir(tmp_path)
+
+    def maak(rijen=(), naam="metingen.parquet"):
+        path = str(tmp_path / naam)
+        if rijen:
+            df = datastore.with_ids(datastore.normalize_frame(pd.DataFrame(list(rijen))))
+            datastore.backend(path).replace_store(df, path)
+        return path
+    return maak
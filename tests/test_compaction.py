@@ -0,0 +1,71 @@
+import pandas as pd
+import pytest
+
+import datastore
+import shareddata
+import sqlstore
+
+
+def test_writes_compact_the_journal(maak_store, rij, monkeypatch):
+    monkeypatch.setattr(datastore, 'COMPACT_BYTES', 2_000)
+    path = maak_store()
+    dataset = shareddata.SharedDataset(path)
+    for i in range(30):
+        dataset.insert([rij(ph=7.0 + i / 100)])
+    # In the background, not in the write that passed the limit
+    datastore._compacties[path].join()
+    assert datastore.journal_size(path) <= 2_000
+    assert len(datastore.read_store(path)) > 0
+    assert len(dataset.snapshot().data) == 30
+    assert len(datastore.load(path, excel_file=None)) == 30
+
+
+def test_sqlite_writes_compact_the_journal(maak_store, rij, monkeypatch):
+    monkeypatch.setattr(sqlstore, 'COMPACT_ROWS', 5)
+    path = maak_store(naam="metingen.sqlite")
+    dataset = shareddata.SharedDataset(path)
+    for i in range(12):
+        dataset.insert([rij(ph=7.0 + i / 100)])
+    assert len(sqlstore.read_journal_from(0, path)[0]) <= 5
+    assert len(dataset.snapshot().data) == 12
+
+
+def test_crash_between_store_and_journal_keeps_rows_once(maak_store, rij, monkeypatch):
+    path = maak_store([rij(datum=f'2025-05-{dag:02d}T12:30:00') for dag in range(1, 6)])
+    ids = datastore.append_rows([rij(datum='2025-05-03T18:00:00', ph=8.0)], path)
+    datastore.update_rows({ids[0]: {'PH': 8.5}}, path)
+
+    def crash(offset, path):
+        raise KeyboardInterrupt
+
+    monkeypatch.setattr(datastore, '_cut_journal', crash)
+    with pytest.raises(KeyboardInterrupt):
+        datastore.compact(path)
+    # The new store holds the journal, the journal is still all there
+    assert len(datastore.read_store(path)) == 6
+    assert len(datastore.read_journal(path)) == 2
+
+    df = datastore.load(path, excel_file=None)
+    assert df.index.is_unique
+    assert len(df) == 6
+    assert df.loc[ids[0], 'PH'] == 8.5
+    gelezen = pd.concat(datastore.iter_range('2025-05-01', '2025-05-31', path))
+    assert sorted(gelezen.index) == sorted(df.index)
+
+
+def test_write_during_compaction_is_kept(maak_store, rij, monkeypatch):
+    path = maak_store([rij(datum='2025-05-01T12:30:00')])
+    datastore.append_rows([rij(datum='2025-05-02T12:30:00')], path)
+    write_tmp = datastore._write_tmp
+    tijdens = []
+
+    def write_tmp_met_schrijver(df, path, tmp_path=None):
+        # Writers are not blocked while the new store is built
+        tijdens.extend(datastore.append_rows([rij(datum='2025-05-03T12:30:00')], path))
+        return write_tmp(df, path, tmp_path)
+
+    monkeypatch.setattr(datastore, '_write_tmp', write_tmp_met_schrijver)
+    datastore.compact(path)
+    assert len(datastore.read_store(path)) == 2
+    assert [row[datastore.ID_COLUMN] for entry in datastore.read_journal(path) for row in entry["rows"]] == tijdens
+    assert len(datastore.load(path, excel_file=None)) == 3
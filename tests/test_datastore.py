@@ -0,0 +1,55 @@
+import json
+
+import pandas as pd
+
+import datastore
+
+
+def _metingen(rij):
+    return [
+        rij('Rokin', '2025-05-01T10:00:00', 7.0, Temperatuur=15.0),
+        rij('Rokin', '2025-05-12T10:00:00', 7.4, Temperatuur=15.0),
+        rij('Spaklerweg', '2025-05-12T11:00:00', 8.8, Temperatuur=15.0),
+        rij('Spaklerweg', '2025-06-02T11:00:00', 6.1, Temperatuur=15.0),
+    ]
+
+
+def _writes(path, rij):
+    # One of each journal entry, by id, against the stored rows
+    ids = list(datastore.read_store(path).index)
+    nieuw = datastore.append_rows([rij('Rokin', '2025-05-12T15:00:00', 9.9), rij('Weesperplein', '2025-06-03T09:00:00', 7.7)], path)
+    datastore.delete_rows([ids[1]], path)
+    datastore.update_rows({ids[2]: {'PH': 5.0}, nieuw[1]: {'Locatie': 'Waterlooplein', 'Datum': '2025-05-30T09:00:00'}}, path)
+    return ids, nieuw
+
+
+def test_journal_format(maak_store, rij):
+    path = maak_store(_metingen(rij))
+    ids, nieuw = _writes(path, rij)
+    with open(datastore.journal_path(path), encoding="utf-8") as journal:
+        regels = journal.read().splitlines()
+    entries = [json.loads(regel) for regel in regels]
+    assert [entry["op"] for entry in entries] == ["insert", "delete", "update"]
+    assert [row[datastore.ID_COLUMN] for row in entries[0]["rows"]] == nieuw
+    assert entries[1]["ids"] == [ids[1]]
+    assert entries[2]["changes"][ids[2]] == {'PH': 5.0}
+    assert datastore.read_journal(path) == entries
+
+
+def test_delete_and_update_by_id(maak_store, rij):
+    path = maak_store(_metingen(rij))
+    ids, nieuw = _writes(path, rij)
+    df = datastore.load(path, excel_file=None)
+    assert ids[1] not in df.index
+    assert len(df) == 5
+    assert df.loc[ids[2], 'PH'] == 5.0
+    assert df.loc[nieuw[1], 'Locatie'] == 'Waterlooplein'
+    assert df.loc[nieuw[1], 'Datum'] == pd.Timestamp('2025-05-30 09:00')
+
+    # Compaction replays the journal into the store, with the same result
+    datastore.compact(path)
+    assert datastore.read_journal(path) == []
+    kolommen = ['Locatie', 'Coordinaten', 'PH', 'Temperatuur', 'Datum']
+    pd.testing.assert_frame_equal(
+        datastore.load(path, excel_file=None)[kolommen].sort_index(), df[kolommen].sort_index(), check_index_type=False
+    )
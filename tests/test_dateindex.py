@@ -0,0 +1,19 @@
+import pandas as pd
+
+import dateindex
+
+
+def test_range_rows_matches_a_mask():
+    df = pd.DataFrame({'Datum': pd.to_datetime([
+        '2025-05-03 08:00', '2025-05-01 23:59', None, '2025-05-02 00:00', '2025-05-04 00:00', '2025-05-03 17:30',
+    ])}, index=list('abcdef'))
+    index = dateindex.build_date_index(df)
+    assert list(index.days.date.astype(str)) == ['2025-05-01', '2025-05-02', '2025-05-03', '2025-05-04']
+
+    rows = dateindex.range_rows(df, index, '2025-05-02', '2025-05-03')
+    masker = (df['Datum'] >= '2025-05-02') & (df['Datum'] < '2025-05-04')
+    assert sorted(rows.index) == sorted(df.index[masker])
+    assert list(dateindex.day_rows(df, index, '2025-05-03').index) == ['a', 'f']
+    assert dateindex.day_rows(df, index, '2025-06-01').empty
+    assert dateindex.adjacent_day(index, '2025-05-03', -1).isoformat() == '2025-05-02'
+    assert dateindex.adjacent_day(index, '2025-05-04', 1) is None
@@ -0,0 +1,53 @@
+import threading
+
+import datastore
+import export
+
+
+def test_export_cache_builds_once_per_version(maak_store, rij):
+    path = maak_store([rij(datum='2025-05-01T12:30:00'), rij(datum='2025-05-02T12:30:00')])
+    cache = export.ExportCache()
+    eerste = export.cached_export_file('2025-05-01', '2025-05-31', 'CSV', path, cache)
+    assert export.cached_export_file('2025-05-01', '2025-05-31', 'CSV', path, cache) is eerste
+    assert (cache.hits, cache.misses) == (1, 1)
+
+    # A write changes the data version, so the next request builds a new file
+    datastore.append_rows([rij(datum='2025-05-03T12:30:00')], path)
+    tweede = export.cached_export_file('2025-05-01', '2025-05-31', 'CSV', path, cache)
+    assert tweede != eerste
+    assert cache.misses == 2
+
+
+def test_export_cache_shares_a_build_in_progress():
+    cache = export.ExportCache()
+    gestart, verder = threading.Event(), threading.Event()
+    builds = []
+
+    def build():
+        builds.append(1)
+        gestart.set()
+        verder.wait(timeout=5)
+        return b"bestand"
+
+    eerste = threading.Thread(target=cache.get_or_build, args=('sleutel', build))
+    eerste.start()
+    gestart.wait()
+    tweede = []
+    wachter = threading.Thread(target=lambda: tweede.append(cache.get_or_build('sleutel', build)))
+    wachter.start()
+    verder.set()
+    eerste.join()
+    wachter.join()
+    assert tweede == [b"bestand"]
+    assert len(builds) == 1
+    assert not cache._bezig
+
+
+def test_export_cache_evicts_least_recently_used():
+    cache = export.ExportCache(max_bytes=10)
+    cache.get_or_build('a', lambda: b"12345")
+    cache.get_or_build('b', lambda: b"12345")
+    cache.get_or_build('a', lambda: b"nooit")
+    cache.get_or_build('c', lambda: b"12345")
+    assert list(cache._bestanden) == ['a', 'c']
+    assert cache.bytes == 10
@@ -0,0 +1,35 @@
+import pandas as pd
+
+import datastore
+import importer
+
+
+def test_validate_rejects_rows_with_the_reason(rij):
+    df = datastore.normalize_frame(pd.DataFrame([
+        rij(ph='7,4'),                                  # comma decimal as typed in Excel
+        rij(locatie=' '),
+        rij(datum=None),
+        rij(coordinaten='52.36;4.90'),
+        rij(ph=25),
+        rij(Humidity=140),
+    ]))
+    geaccepteerd, afgekeurd = importer.validate(df)
+    assert geaccepteerd['PH'].tolist() == [7.4]
+    assert afgekeurd['Reden'].tolist() == [
+        "Locatie ontbreekt",
+        "Datum ontbreekt of is ongeldig",
+        "Ongeldige of ontbrekende coördinaten",
+        "PH-waarde lijkt onrealistisch hoog/laag",
+        "Humidity moet tussen 0 en 100 liggen",
+    ]
+
+
+def test_upload_with_separate_latitude_and_longitude(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "logger.csv").write_text(
+        "Locatie;Datum;PH;Latitude;Longitude\nRokin;20-05-2025 12:30;7,4;52,3677279;4,8938338\n", encoding="utf-8"
+    )
+    df = importer.read_upload(str(tmp_path / "logger.csv"), "logger.csv")
+    geaccepteerd, afgekeurd = importer.validate(df)
+    assert afgekeurd.empty
+    assert geaccepteerd['Coordinaten'].tolist() == ['52.3677279, 4.8938338']
@@ -0,0 +1,66 @@
+import asyncio
+
+import datastore
+import ingest
+
+
+def test_failed_write_keeps_batch_and_is_retried(tmp_path, monkeypatch, rij):
+    monkeypatch.setattr(ingest, 'FOUT_WACHTTIJD', 0)
+    path = str(tmp_path / "ontbreekt" / "metingen.parquet")
+    batcher = ingest.MicroBatcher(path, batch_grootte=10)
+    batcher.add([rij(ph=7.4)])
+
+    asyncio.run(batcher.flush())
+    status = batcher.status()
+    assert status['in_buffer'] == 1
+    assert status['fouten'] == 1
+    assert 'FileNotFoundError' in status['laatste_fout']
+
+    (tmp_path / "ontbreekt").mkdir()
+    asyncio.run(batcher.flush())
+    assert batcher.status()['in_buffer'] == 0
+    assert batcher.opgeslagen == 1
+    assert len(datastore.load(path, excel_file=None)) == 1
+
+
+def _verzoek(batcher, verzoek):
+    async def stuur():
+        reader = asyncio.StreamReader()
+        reader.feed_data(verzoek)
+        reader.feed_eof()
+        writer = _Writer()
+        await ingest.handle(batcher, reader, writer)
+        return writer.antwoord.decode("utf-8")
+    return asyncio.run(stuur())
+
+
+class _Writer:
+
+    def __init__(self):
+        self.antwoord = b""
+
+    def write(self, data):
+        self.antwoord += data
+
+    async def drain(self):
+        pass
+
+    def close(self):
+        pass
+
+
+def test_invalid_datum_gets_bad_request(tmp_path):
+    batcher = ingest.MicroBatcher(str(tmp_path / "metingen.parquet"))
+    for datum in ['[1, 2]', '{"x": 1}', '"geen datum"']:
+        body = f'{{"Locatie": "Rokin", "PH": 7.4, "Datum": {datum}}}'.encode("utf-8")
+        antwoord = _verzoek(batcher, b"POST /metingen HTTP/1.1\r\nContent-Length: %d\r\n\r\n" % len(body) + body)
+        assert antwoord.startswith("HTTP/1.1 400 Bad Request")
+        assert "Ongeldige Datum" in antwoord
+    assert batcher.ontvangen == 0
+
+
+def test_oversized_body_is_refused(tmp_path, monkeypatch):
+    monkeypatch.setattr(ingest, 'MAX_BODY_BYTES', 100)
+    batcher = ingest.MicroBatcher(str(tmp_path / "metingen.parquet"))
+    antwoord = _verzoek(batcher, b"POST /metingen HTTP/1.1\r\nContent-Length: 10000000000\r\n\r\n{}")
+    assert antwoord.startswith("HTTP/1.1 413")
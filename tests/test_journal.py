@@ -0,0 +1,79 @@
+import threading
+
+import pandas as pd
+
+import datastore
+import export
+
+
+def test_iter_range_streams_journal_inserts(maak_store, rij):
+    path = maak_store([rij(datum=f'2025-05-{dag:02d}T12:30:00') for dag in range(1, 11)])
+    ids = []
+    for dag in range(1, 11):
+        ids += datastore.append_rows([rij(datum=f'2025-05-{dag:02d}T12:30:00', ph=8.0), rij(datum=f'2025-05-{dag:02d}T12:30:00', ph=8.5)], path)
+    datastore.delete_rows([ids[4]], path)
+    datastore.update_rows({ids[6]: {'PH': 9.1}}, path)
+
+    batches = list(datastore.iter_range('2025-05-03', '2025-05-06', path, batch_rows=3))
+    assert all(len(batch) <= 3 for batch in batches)
+    verwacht = datastore.load(path, excel_file=None)
+    verwacht = verwacht[(verwacht['Datum'] >= '2025-05-03') & (verwacht['Datum'] < '2025-05-07')]
+    gelezen = pd.concat(batches)
+    assert sorted(gelezen.index) == sorted(verwacht.index)
+    assert ids[4] not in gelezen.index
+    assert gelezen.loc[ids[6], 'PH'] == 9.1
+
+
+def test_export_of_journal_inserts_keeps_column_types(maak_store, rij):
+    # Form rows come without 'Meetdag'; the Parquet export needs it as a date column
+    path = maak_store([rij(datum=f'2025-05-{dag:02d}T12:30:00') for dag in range(1, 11)])
+    datastore.append_rows([rij(datum='2025-05-03T12:30:00', ph=8.0)], path)
+    for formaat in export.FORMATEN:
+        assert export.export_file('2025-05-01', '2025-05-10', formaat, path)
+
+
+def test_load_during_compaction_sees_each_row_once(maak_store, rij, monkeypatch):
+    path = maak_store([rij(datum=f'2025-05-{dag:02d}T12:30:00') for dag in range(1, 11)])
+    datastore.append_rows([rij(datum='2025-05-03T12:30:00', ph=8.0), rij(datum='2025-05-04T12:30:00', ph=8.0)], path)
+    vervangen, geladen = threading.Event(), threading.Event()
+    cut_journal = datastore._cut_journal
+
+    def trage_cut_journal(offset, path):
+        # The window between replacing the store and cutting the journal
+        vervangen.set()
+        geladen.wait(timeout=1)
+        cut_journal(offset, path)
+
+    monkeypatch.setattr(datastore, '_cut_journal', trage_cut_journal)
+    compactie = threading.Thread(target=datastore.compact, args=(path,))
+    compactie.start()
+    vervangen.wait()
+    df = datastore.load(path, excel_file=None)
+    geladen.set()
+    compactie.join()
+    assert df.index.is_unique
+    assert len(df) == 12
+
+
+def test_iter_range_during_compaction_sees_each_row_once(maak_store, rij, monkeypatch):
+    path = maak_store([rij(datum=f'2025-05-{dag:02d}T12:30:00') for dag in range(1, 11)])
+    datastore.append_rows([rij(datum='2025-05-03T12:30:00', ph=8.0)], path)
+    datastore.update_rows({datastore.read_store(path).index[0]: {'PH': 6.0}}, path)
+    read_journal = datastore.read_journal
+    compacties = []
+
+    def read_journal_en_compact(path):
+        # A compaction right after the journal was read
+        entries = read_journal(path)
+        compactie = threading.Thread(target=datastore.compact, args=(path,))
+        compactie.start()
+        compactie.join(timeout=0.5)
+        compacties.append(compactie)
+        return entries
+
+    monkeypatch.setattr(datastore, 'read_journal', read_journal_en_compact)
+    gelezen = pd.concat(datastore.iter_range('2025-05-01', '2025-05-31', path))
+    compacties[0].join()
+    assert gelezen.index.is_unique
+    assert len(gelezen) == 11
+    assert (gelezen['PH'] == 6.0).sum() == 1
@@ -0,0 +1,25 @@
+import datastore
+import management
+import preprocessing
+
+
+def test_edit_round_trip_keeps_decimal_value(maak_store, rij):
+    path = maak_store([
+        rij('Rokin', '2025-05-20T12:30:00', 8.3, Temperatuur=19.1),
+        rij('Spaklerweg', '2025-05-20T13:00:00', 8.45, '52.3406215, 4.9161200', Temperatuur=19.5),
+    ])
+    data = preprocessing.prepare_frame(datastore.load(path, excel_file=None))
+    assert data['PH'].dtype == 'float32'
+
+    bewerkt = management.editor_frame(data)
+    meting_id = bewerkt.index[0]
+    bewerkt.loc[meting_id, 'PH'] = 7.1
+    wijzigingen = management.changed_cells(data, bewerkt)
+    # Untouched float32 cells do not show up as edits
+    assert wijzigingen == {meting_id: {'PH': 7.1}}
+
+    datastore.update_rows(wijzigingen, path)
+    datastore.compact(path)
+    opgeslagen = datastore.read_store(path)
+    assert opgeslagen.loc[meting_id, 'PH'] == 7.1
+    assert opgeslagen['Temperatuur'].tolist() == [19.1, 19.5]
@@ -0,0 +1,41 @@
+import pandas as pd
+
+import mapview
+
+
+def _dag():
+    return pd.DataFrame({
+        'Locatie': ['Rokin', 'Spaklerweg', 'Elders'],
+        'Datum': pd.to_datetime(['2024-05-01 10:00', '2024-05-01 11:00', '2024-05-01 12:00']),
+        'PH': [7.1, 8.9, None],
+        'lat': [52.3677279, 52.3406215, None],
+        'lon': [4.8938338, 4.9161200, None],
+        'kleur': pd.Categorical(['green', 'red', 'gray']),
+        'coord_ok': [True, True, False],
+    }, index=[10, 11, 12])
+
+
+def _html(laag):
+    # As st_folium adds it: to the base map
+    kaart = mapview.fresh_root(mapview.build_base_map())
+    kaart.add_child(laag)
+    return kaart.get_root().render()
+
+
+def test_viewport_layer_details_on_click():
+    ruimtelijk = mapview.build_viewport_index(_dag())
+    posities = mapview.viewport_positions(ruimtelijk, None)
+    laag = mapview.viewport_layer(ruimtelijk, posities, ['PH'], details_bij_klik=True)
+    assert laag is mapview.viewport_layer(ruimtelijk, posities, ['PH'], details_bij_klik=True)
+    assert 'bindPopup' not in _html(laag)
+    assert 'bindPopup' in _html(mapview.viewport_layer(ruimtelijk, posities, ['PH'], details_bij_klik=False))
+
+    geselecteerd = mapview.viewport_clicked(ruimtelijk, {'lat': 52.3406215, 'lng': 4.9161200})
+    assert geselecteerd['Locatie'].tolist() == ['Spaklerweg']
+
+
+def test_viewport_layer_clusters_above_threshold():
+    ruimtelijk = mapview.build_viewport_index(_dag())
+    posities = mapview.viewport_positions(ruimtelijk, None)
+    laag = mapview.viewport_layer(ruimtelijk, posities, ['PH'], details_bij_klik=True, cluster_drempel=1)
+    assert 'markerClusterGroup' in _html(laag)
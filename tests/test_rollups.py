@@ -0,0 +1,30 @@
+import pandas as pd
+
+import datastore
+import rollups
+import shareddata
+
+
+def test_updated_rollups_match_a_rebuild(maak_store, rij):
+    path = maak_store([
+        rij('Rokin', '2025-05-01T10:00:00', 7.0, Temperatuur=15.0),
+        rij('Rokin', '2025-05-12T10:00:00', 7.4, Temperatuur=16.0),
+        rij('Spaklerweg', '2025-05-12T11:00:00', 8.8, Temperatuur=17.0),
+        rij('Spaklerweg', '2025-06-02T11:00:00', 6.1, Temperatuur=18.0),
+    ])
+    dataset = shareddata.SharedDataset(path)
+    dataset.trends(dataset.snapshot().data)
+    ids = list(dataset.snapshot().data.index)
+    nieuw = datastore.append_rows([rij('Rokin', '2025-05-12T15:00:00', 9.9), rij('Weesperplein', '2025-06-03T09:00:00', 7.7)], path)
+    datastore.delete_rows([ids[1]], path)
+    datastore.update_rows({ids[2]: {'PH': 5.0}, nieuw[1]: {'Locatie': 'Waterlooplein', 'Datum': '2025-05-30T09:00:00'}}, path)
+
+    data = dataset.refresh().data
+    assert dataset._rollups[0] is data  # updated by _merge, not rebuilt
+    bijgewerkt = dataset.trends(data)
+    opnieuw = rollups.build_rollups(data)
+    for periode in rollups.PERIODES:
+        for kolom in rollups.ROLLUP_KOLOMMEN:
+            pd.testing.assert_frame_equal(
+                bijgewerkt.table(periode, kolom).sort_index(), opnieuw.table(periode, kolom).sort_index()
+            )
@@ -0,0 +1,23 @@
+import pandas as pd
+
+import datastore
+import preprocessing
+import shareddata
+
+
+def test_merge_matches_replay(maak_store, rij):
+    # A session that merges the journal into its snapshot (SharedDataset._merge)
+    # sees the same rows as a full load, which replays it (apply_journal)
+    path = maak_store([rij('Rokin', '2025-05-01T10:00:00', 7.0), rij('Spaklerweg', '2025-05-12T11:00:00', 8.8)])
+    dataset = shareddata.SharedDataset(path)
+    ids = list(dataset.snapshot().data.index)
+    nieuw = datastore.append_rows([rij('Rokin', '2025-05-12T15:00:00', 9.9), rij('Weesperplein', '2025-06-03T09:00:00', 7.7)], path)
+    datastore.delete_rows([ids[0]], path)
+    datastore.update_rows({ids[1]: {'PH': 5.0}, nieuw[1]: {'Locatie': 'Waterlooplein', 'Datum': '2025-05-30T09:00:00'}}, path)
+
+    data = dataset.refresh().data
+    assert dataset.full_reloads == 0
+    verwacht = preprocessing.prepare_frame(datastore.load(path, excel_file=None))
+    pd.testing.assert_frame_equal(
+        data[list(verwacht.columns)].sort_index(), verwacht.sort_index(), check_categorical=False, check_dtype=False
+    )
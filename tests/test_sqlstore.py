@@ -0,0 +1,37 @@
+import pandas as pd
+
+import datastore
+import sqlstore
+
+
+def _metingen(rij):
+    return [rij(datum=f'2025-05-{dag:02d}T12:30:00', ph=7.0 + dag / 10) for dag in range(1, 8)]
+
+
+def test_sqlite_load_matches_parquet(maak_store, rij):
+    # The same rows and writes on both backends give the same frame
+    paden = [maak_store(_metingen(rij), naam) for naam in ["metingen.parquet", "metingen.sqlite"]]
+    for path in paden:
+        store = datastore.backend(path)
+        nieuw = store.append_rows([rij(locatie='Spaklerweg', datum='2025-05-04T09:00:00', coordinaten='52.3406215, 4.9161200')], path)
+        store.update_rows({nieuw[0]: {'PH': 6.4, 'Coordinaten': '52.3400000, 4.9160000'}}, path)
+    parquet, sqlite = (datastore.backend(path).load(path, excel_file=None) for path in paden)
+    assert len(sqlite) == 8
+    kolommen = ['Locatie', 'Coordinaten', 'PH', 'Datum']
+    pd.testing.assert_frame_equal(
+        sqlite[kolommen].sort_values('Datum').reset_index(drop=True),
+        parquet[kolommen].sort_values('Datum').reset_index(drop=True),
+        check_dtype=False,
+    )
+
+
+def test_sqlite_iter_range_filters_in_sql(maak_store, rij):
+    path = maak_store(_metingen(rij), "metingen.sqlite")
+    ids = sqlstore.append_rows([rij(datum='2025-05-03T18:00:00', ph=9.0)], path)
+    sqlstore.delete_rows(ids, path)
+    batches = list(sqlstore.iter_range('2025-05-02', '2025-05-04', path, batch_rows=2))
+    assert [len(batch) for batch in batches] == [2, 1]
+    gelezen = pd.concat(batches)
+    assert gelezen['Datum'].dt.day.tolist() == [2, 3, 4]
+    assert gelezen.index.name == datastore.ID_COLUMN
+    assert ids[0] not in gelezen.index
@@ -0,0 +1,82 @@
+import asyncio
+import io
+
+import pandas as pd
+
+import datastore
+import importer
+import ingest
+import management
+import shareddata
+import stations
+
+
+def _registry(path):
+    stations.write_registry(pd.DataFrame(
+        {'naam': ['Rokin', 'Spaklerweg'], 'lat': [52.3677279, 52.3406215], 'lon': [4.8938338, 4.9161200]},
+        index=pd.Index([1, 2], name=datastore.STATION_COLUMN),
+    ), path)
+
+
+def test_snap_keeps_measured_coordinates(tmp_path):
+    path = str(tmp_path / "stations.csv")
+    _registry(path)
+    rows = stations.snap_rows([
+        {'Locatie': 'Rokin', 'Coordinaten': '52.3677500, 4.8938000'},   # ~25 m away
+        {'Locatie': None, 'Coordinaten': '52.3406300, 4.9161100'},
+        {'Locatie': 'Spaklerweg', 'Coordinaten': None},                 # name only
+        {'Locatie': 'Elders', 'Coordinaten': '52.5000000, 4.9000000'},  # no station near
+    ], path)
+    assert rows[0] == {'Locatie': 'Rokin', 'Coordinaten': '52.3677500, 4.8938000', 'station_id': 1}
+    assert rows[1] == {'Locatie': 'Spaklerweg', 'Coordinaten': '52.3406300, 4.9161100', 'station_id': 2}
+    assert rows[2] == {'Locatie': 'Spaklerweg', 'Coordinaten': '52.3406215, 4.9161200', 'station_id': 2}
+    assert 'station_id' not in rows[3]
+
+
+def test_ingest_snaps_before_validation(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    _registry(stations.STATIONS_FILE)
+    path = str(tmp_path / "metingen.parquet")
+    batcher = ingest.MicroBatcher(path)
+    batcher.add([{'Locatie': 'Rokin', 'PH': 7.4, 'Datum': '2025-05-20T12:30:00'}])
+    asyncio.run(batcher.flush())
+    assert (batcher.opgeslagen, batcher.afgekeurd) == (1, 0)
+    opgeslagen = datastore.load(path, excel_file=None)
+    assert opgeslagen['Coordinaten'].tolist() == ['52.3677279, 4.8938338']
+    assert opgeslagen['station_id'].tolist() == [1]
+
+
+def test_trends_and_filter_group_on_the_station(maak_store, rij):
+    path = maak_store()
+    _registry(stations.STATIONS_FILE)
+    dataset = shareddata.SharedDataset(path)
+    dataset.insert(stations.snap_rows([
+        rij('Rokin', '2025-05-20T10:00:00', 7.0),
+        rij('Rokin brug', '2025-05-20T11:00:00', 8.0, '52.3677500, 4.8938000'),  # at the Rokin station
+        rij('Elders', '2025-05-20T12:00:00', 9.0, '52.5000000, 4.9000000'),      # no station near
+    ]))
+    data = dataset.snapshot().data
+    trends = dataset.trends(data)
+    assert trends.locations() == ['Elders', 'Rokin']
+    assert trends.table('Dag', 'PH', ['Rokin'])['Gemiddeld'].tolist() == [7.5]
+    namen = dataset.station_names(data)
+    rokin = [sleutel for sleutel, naam in namen.items() if naam == 'Rokin']
+    assert rokin == [1]
+    assert len(management.filter_rows(data, dataset.date_index(data), sleutels=rokin)) == 2
+
+    # Moved away from the station: the edit is snapped again and leaves it
+    brug = data.index[data['Locatie'] == 'Rokin brug'][0]
+    data = dataset.update({brug: {'Coordinaten': '52.4000000, 4.8000000'}}).data
+    assert pd.isna(data.loc[brug, 'station_id'])
+    assert dataset.trends(data).locations() == ['Elders', 'Rokin', 'Rokin brug']
+    assert len(management.filter_rows(data, dataset.date_index(data), sleutels=rokin)) == 1
+
+
+def test_upload_with_only_a_station_name_is_accepted(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    _registry(stations.STATIONS_FILE)
+    bestand = io.StringIO("Locatie;Datum;PH\nSpaklerweg;20-05-2025 12:30;7,4\n")
+    geaccepteerd, afgekeurd = importer.validate(importer.read_upload(bestand, "logger.csv"))
+    assert afgekeurd.empty
+    assert geaccepteerd['Coordinaten'].tolist() == ['52.3406215, 4.9161200']
+    assert geaccepteerd['station_id'].tolist() == [2]